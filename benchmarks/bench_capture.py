@@ -0,0 +1,170 @@
+"""Micro-benchmarks and regression gate for the audio capture hot loop.
+
+Drives a real AudioManager/CaptureSource against a fake sounddevice
+InputStream (benchmarks/fake_sounddevice.py) and measures:
+  block_cpu_us        - capture thread CPU time per block (real time and flat out)
+  block_alloc_bytes   - bytes retained per captured block (tracemalloc)
+  finalize_ms_<N>s    - to_int16 + write_wav for an N second recording (10s/1min/10min)
+
+Results are compared against benchmarks/baseline_capture.json; any metric
+more than --tolerance above its baseline fails the run (exit code 1).
+
+  python benchmarks/bench_capture.py
+  python benchmarks/bench_capture.py --update-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import fake_sounddevice
+fake_sounddevice.install()
+
+from src.audio import AudioManager, BLOCK_DURATION, write_wav
+
+BASELINE_FILE = os.path.join(ROOT, "baseline_capture.json")
+FINALIZE_SECONDS = (10, 60, 600)
+# Absolute slack on top of the relative tolerance, so tiny metrics don't flap on timer noise
+NOISE_FLOOR = {'block_cpu_us': 10.0, 'block_alloc_bytes': 512.0, 'finalize_ms': 3.0}
+
+logger = logging.getLogger("bench")
+
+def thread_cpu_clock(thread):
+    """Per-thread CPU clock (Linux/BSD); None where the platform lacks it."""
+    try:
+        clock = time.pthread_getcpuclockid(thread.ident)
+        return lambda: time.clock_gettime(clock)
+    except (AttributeError, OSError):
+        return None
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline: raise TimeoutError("capture thread did not respond")
+        time.sleep(0.001)
+
+def run_capture(blocks, speed, trace=False):
+    """Record `blocks` blocks from the fake stream; returns per-block CPU (us),
+    retained bytes per block and the recording's xrun stats."""
+    fake_sounddevice.speed = speed
+    audio = AudioManager(queue.Queue(), logger)
+    source = audio.primary
+    audio.update_settings(auto_stop=False, voice_trigger=False)
+    try:
+        if trace: tracemalloc.start()
+        audio.trigger_start()
+        wait_for(lambda: source.stream is not None and source.state == "RECORDING")
+        if speed == 0:
+            source.stream.consumer = lambda: len(source.audio_data)
+        cpu = thread_cpu_clock(source.thread)
+        start_blocks = len(source.audio_data)
+        traced_start = tracemalloc.get_traced_memory()[0] if trace else 0
+        cpu_start = cpu() if cpu else None
+        wait_for(lambda: len(source.audio_data) - start_blocks >= blocks, timeout=blocks * BLOCK_DURATION * 2 + 10)
+        cpu_end = cpu() if cpu else None
+        captured = len(source.audio_data) - start_blocks
+        traced_end = tracemalloc.get_traced_memory()[0] if trace else 0
+        audio.trigger_stop()
+        audio_data, stats = source.recordings.get(timeout=5)
+    finally:
+        if trace: tracemalloc.stop()
+        audio.stop()
+    return {
+        'cpu_us': (cpu_end - cpu_start) / captured * 1e6 if cpu else None,
+        'bytes': (traced_end - traced_start) / captured if trace else None,
+        'overflows': stats['overflows'],
+        'dropped_frames': stats['dropped_frames'],
+        'blocks': len(audio_data),
+    }
+
+def run_finalize(seconds, repeat=5):
+    """Best-of-N time to turn an N second list of blocks into a WAV file."""
+    block = fake_sounddevice.make_block(int(16000 * BLOCK_DURATION), 0, 16000)
+    audio_data = [block.copy() for _ in range(int(seconds / BLOCK_DURATION))]
+    best = None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.wav")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            write_wav(path, audio_data)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+def run_all(args):
+    results = {}
+    realtime = run_capture(int(args.realtime_seconds / BLOCK_DURATION), speed=args.speed)
+    results['block_cpu_us_realtime'] = realtime['cpu_us']
+    print(f"realtime x{args.speed:g}: {realtime['blocks']} blocks, {realtime['cpu_us']:.1f} us/block CPU, "
+          f"{realtime['overflows']} overflows, {realtime['dropped_frames']} dropped frames")
+    
+    flat = run_capture(args.blocks, speed=0)
+    results['block_cpu_us_flat'] = flat['cpu_us']
+    print(f"flat out:    {flat['blocks']} blocks, {flat['cpu_us']:.1f} us/block CPU")
+    
+    traced = run_capture(args.blocks, speed=0, trace=True)
+    results['block_alloc_bytes'] = traced['bytes']
+    print(f"allocations: {traced['bytes']:.0f} bytes retained/block")
+    
+    for seconds in FINALIZE_SECONDS:
+        ms = run_finalize(seconds)
+        results[f'finalize_ms_{seconds}s'] = ms
+        print(f"finalize {seconds:>4}s: {ms:.1f} ms")
+    return {k: v for k, v in results.items() if v is not None}
+
+def check(results, baseline, tolerance):
+    """Metrics above baseline * (1 + tolerance) plus the noise floor; every
+    metric is lower-is-better."""
+    failures = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None: continue
+        floor = next((v for k, v in NOISE_FLOOR.items() if name.startswith(k)), 0.0)
+        limit = base * (1 + tolerance) + floor
+        status = "FAIL" if value > limit else "ok"
+        print(f"  {name:<24} {value:>10.1f}  baseline {base:>10.1f}  limit {limit:>10.1f}  {status}")
+        if value > limit: failures.append(name)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--realtime-seconds", type=float, default=3.0, help="Length of the paced run")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pacing of the paced run (x real time)")
+    parser.add_argument("--blocks", type=int, default=2000, help="Blocks for the flat-out runs")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed regression, fraction of baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    
+    results = run_all(args)
+    if args.json:
+        with open(args.json, "w") as f: json.dump(results, f, indent=2)
+    
+    if args.update_baseline:
+        with open(args.baseline, "w") as f: json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --update-baseline")
+        return 0
+    with open(args.baseline) as f: baseline = json.load(f)
+    print(f"Against baseline (tolerance {args.tolerance:.0%}):")
+    failures = check(results, baseline, args.tolerance)
+    if failures:
+        print(f"Regression: {', '.join(failures)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Throughput/latency benchmark for the transcription pipeline against a fake ComfyUI.
+
+Replays a WAV corpus through one or more paths and reports jobs/s and
+p50/p95/p99 latency:
+  local - ComfyClient.process() from a pool of threads (processing workers)
+  lan   - multipart POSTs to the LAN /transcribe server
+  bot   - BotJobs flooded through the JobScheduler with the app's worker/limit settings
+
+  python benchmarks/bench_pipeline.py --mode all --jobs 40 --delay 0.05 --rtf 0.02
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from fake_comfy import FakeComfy
+from corpus import load_corpus, synth_corpus
+
+import src.comfy
+from src.comfy import ComfyClient
+from src.config import PROCESSING_WORKERS, PROCESSING_LIMITS
+from src.network import ThreadedHTTPServer, RequestHandlerFactory
+from src.scheduler import JobScheduler, BOT
+from src.tasks import BotJob, RUNNING, DONE, FAILED
+from src.codec import decode_audio
+
+logger = logging.getLogger("bench")
+
+def percentile(values, p):
+    if not values: return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+def report(mode, latencies, errors, wall):
+    n = len(latencies)
+    result = {
+        "mode": mode,
+        "jobs": n + errors,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "jobs_per_s": round(n / wall, 2) if wall > 0 else None,
+    }
+    for p in (50, 95, 99):
+        v = percentile(latencies, p)
+        result[f"p{p}_ms"] = None if v is None else round(v * 1000, 1)
+    return result
+
+def run_local(comfy, files, jobs, concurrency):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    
+    def one(i):
+        t0 = time.perf_counter()
+        text = comfy.process(files[i % len(files)])
+        dt = time.perf_counter() - t0
+        with lock:
+            if text: latencies.append(dt)
+            else: errors[0] += 1
+    
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(jobs)))
+    return report("local", latencies, errors[0], time.perf_counter() - t0)
+
+def run_lan(comfy, files, jobs, concurrency):
+    httpd = ThreadedHTTPServer(("127.0.0.1", 0), RequestHandlerFactory(comfy, logger))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/transcribe"
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            with open(files[i % len(files)], 'rb') as f:
+                resp = requests.post(url, files={"file": ("audio.wav", f, "audio/wav")}, timeout=120)
+            ok = resp.status_code == 200 and resp.text
+        except Exception:
+            ok = False
+        dt = time.perf_counter() - t0
+        with lock:
+            if ok: latencies.append(dt)
+            else: errors[0] += 1
+    
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(jobs)))
+    finally:
+        httpd.shutdown()
+    return report("lan", latencies, errors[0], time.perf_counter() - t0)
+
+def run_bot(comfy, files, jobs, concurrency):
+    # Mirrors VoiceInputterApp.process_bot_job without the GUI/chat replies
+    # Per-chat ordering as in the app; the chat queue caps and rate limits are left out of a flood test
+    scheduler = JobScheduler(PROCESSING_LIMITS)
+    # Bot audio arrives decoded in memory, as the chat clients deliver it
+    clips = [decode_audio(open(path, 'rb').read()) for path in files]
+    finished = []
+    done = threading.Semaphore(0)
+    
+    def worker():
+        while True:
+            job = scheduler.get()
+            try:
+                job.mark(RUNNING)
+                job.text = comfy.transcribe(audio=job.audio, sample_rate=job.sample_rate, job_id=job.id, source=job.origin)
+                job.mark(DONE if job.text else FAILED)
+            except Exception:
+                job.mark(FAILED)
+            finally:
+                scheduler.task_done(job)
+                finished.append(job)
+                done.release()
+    
+    for _ in range(PROCESSING_WORKERS):
+        threading.Thread(target=worker, daemon=True).start()
+    
+    t0 = time.perf_counter()
+    for i in range(jobs):
+        samples, rate = clips[i % len(clips)]
+        job = BotJob(source="telegram", audio=samples, sample_rate=rate, chat_id=str(i % 4))
+        scheduler.put(job, BOT, key=job.order_key)
+    for _ in range(jobs):
+        done.acquire()
+    wall = time.perf_counter() - t0
+    latencies = [j.elapsed("queued", DONE) for j in finished if j.state == DONE]
+    return report("bot", latencies, jobs - len(latencies), wall)
+
+MODES = {"local": run_local, "lan": run_lan, "bot": run_bot}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=list(MODES) + ["all"], default="all")
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=PROCESSING_WORKERS, help="client threads (local/lan)")
+    parser.add_argument("--corpus", help="directory of .wav files (default: synthesized)")
+    parser.add_argument("--delay", type=float, default=0.05, help="fake ComfyUI fixed execution time (s)")
+    parser.add_argument("--rtf", type=float, default=0.02, help="fake ComfyUI time per second of audio")
+    parser.add_argument("--comfy", help="benchmark real ComfyUI servers (host:port[,host:port...]) instead of fakes")
+    parser.add_argument("--servers", type=int, default=1, help="number of fake ComfyUI servers in the pool")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    files = load_corpus(args.corpus) if args.corpus else \
+        synth_corpus(os.path.join(tempfile.gettempdir(), "voiceinputter_bench_corpus"))
+    
+    fakes = []
+    if args.comfy:
+        urls = args.comfy.split(",")
+    else:
+        for _ in range(args.servers):
+            fake = FakeComfy(args.delay, args.rtf)
+            fake.start()
+            fakes.append(fake)
+        urls = [fake.url for fake in fakes]
+    
+    # Keep the language cache and any stray files out of the repo
+    workflow = os.path.join(ROOT, "stt.json")
+    os.chdir(tempfile.mkdtemp(prefix="voiceinputter_bench_"))
+    src.comfy.WORKFLOW_FILE = workflow
+    comfy = ComfyClient(logger, str(uuid.uuid4()), urls=urls)
+    # Let the health checks and websockets come up before timing anything
+    deadline = time.time() + 10
+    while time.time() < deadline and not all(s.healthy and s.connected.is_set() for s in comfy.servers):
+        time.sleep(0.05)
+    
+    results = []
+    for mode in (MODES if args.mode == "all" else [args.mode]):
+        results.append(MODES[mode](comfy, files, args.jobs, args.concurrency))
+        print(f"{mode:>6}: " + "  ".join(f"{k}={v}" for k, v in results[-1].items() if k != "mode"))
+    
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"comfy": urls, "delay": args.delay, "rtf": args.rtf, "results": results}, f, indent=2)
+    comfy.stop()
+    for fake in fakes: fake.stop()
+
+if __name__ == "__main__":
+    main()
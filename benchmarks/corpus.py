@@ -0,0 +1,47 @@
+"""WAV corpus for the benchmarks: load a directory of recordings, or synthesize one."""
+import array
+import math
+import os
+import random
+import wave
+
+SAMPLE_RATE = 16000
+
+def load_corpus(directory):
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(".wav"))
+    if not files:
+        raise SystemExit(f"No .wav files in {directory}")
+    return [os.path.abspath(f) for f in files]
+
+def write_wav(path, samples, sample_rate=SAMPLE_RATE):
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.tobytes())
+
+def synth_clip(seconds, rng, sample_rate=SAMPLE_RATE):
+    """Speech-like test signal: bursts of a wobbling tone with noise, separated by pauses."""
+    n = int(seconds * sample_rate)
+    samples = array.array('h', bytes(2 * n))
+    freq = rng.uniform(120, 260)
+    i = 0
+    while i < n:
+        burst = int(rng.uniform(0.2, 0.8) * sample_rate)
+        for j in range(i, min(n, i + burst)):
+            t = j / sample_rate
+            v = 0.3 * math.sin(2 * math.pi * freq * t * (1 + 0.05 * math.sin(7 * t))) + rng.gauss(0, 0.02)
+            samples[j] = max(-32767, min(32767, int(v * 32767)))
+        i += burst + int(rng.uniform(0.1, 0.4) * sample_rate)
+    return samples
+
+def synth_corpus(directory, count=20, min_seconds=1.0, max_seconds=8.0, seed=1):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for k in range(count):
+        rng = random.Random(seed * 100003 + k) # Per clip, so existing files stay reproducible
+        path = os.path.abspath(os.path.join(directory, f"clip_{k:03d}.wav"))
+        if not os.path.exists(path):
+            write_wav(path, synth_clip(rng.uniform(min_seconds, max_seconds), rng))
+        paths.append(path)
+    return paths
@@ -0,0 +1,268 @@
+"""Local stand-in for a ComfyUI server, for benchmarking without a GPU.
+
+Speaks the subset of the ComfyUI API that ComfyClient uses: POST /prompt,
+GET/POST /queue, POST /interrupt, GET /object_info[/<node>], GET /system_stats, GET /history/<id>
+and the /ws websocket. Prompts run one at a time (like ComfyUI) with a
+synthetic delay of `delay + rtf * audio_seconds`.
+
+Run standalone:  python benchmarks/fake_comfy.py --port 8188 --delay 0.2 --rtf 0.05
+"""
+import argparse
+import base64
+import hashlib
+import http.server
+import json
+import os
+import random
+import socketserver
+import struct
+import threading
+import time
+import urllib.parse
+import uuid
+import wave
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+LANGUAGES = ["auto", "English", "German", "French", "Italian", "Spanish", "Japanese", "Chinese"]
+
+def wav_seconds(path):
+    try:
+        with wave.open(path, 'rb') as wf:
+            return wf.getnframes() / float(wf.getframerate() or 1)
+    except Exception:
+        return 0.0
+
+class WsConnection:
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.open = True
+
+    def send(self, obj):
+        payload = json.dumps(obj).encode()
+        header = bytearray([0x81]) # FIN + text frame, server frames are unmasked
+        n = len(payload)
+        if n < 126: header.append(n)
+        elif n < 65536: header += bytes([126]) + struct.pack(">H", n)
+        else: header += bytes([127]) + struct.pack(">Q", n)
+        with self.lock:
+            if not self.open: return
+            try:
+                self.wfile.write(bytes(header) + payload)
+                self.wfile.flush()
+            except Exception:
+                self.open = False
+
+class FakeComfy:
+    def __init__(self, delay=0.2, rtf=0.0, fail_rate=0.0, seed=None, hang_rate=0.0):
+        self.delay = delay
+        self.rtf = rtf
+        self.fail_rate = fail_rate
+        self.hang_rate = hang_rate # Prompts that never report back (stuck node)
+        self.history = {} # prompt_id -> {"outputs": ..., "status": ...}
+        self.random = random.Random(seed)
+        self.clients = {} # client_id -> WsConnection
+        self.pending = [] # [(prompt_id, prompt, client_id)]
+        self.running = None
+        self.cond = threading.Condition()
+        self.interrupted = threading.Event()
+        self.executed = 0
+        self.httpd = None
+        threading.Thread(target=self.executor, daemon=True).start()
+
+    # --- Execution ---
+    def submit(self, prompt, client_id):
+        prompt_id = str(uuid.uuid4())
+        with self.cond:
+            self.pending.append((prompt_id, prompt, client_id))
+            self.cond.notify_all()
+        return prompt_id
+
+    def send(self, client_id, obj):
+        conn = self.clients.get(client_id)
+        if conn: conn.send(obj)
+
+    def executor(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                prompt_id, prompt, client_id = self.pending.pop(0)
+                self.running = prompt_id
+            self.interrupted.clear()
+            self.execute(prompt_id, prompt, client_id)
+            with self.cond:
+                self.running = None
+                self.executed += 1
+
+    def execute(self, prompt_id, prompt, client_id):
+        audio_path = ""
+        target = None
+        for node_id, node in prompt.items():
+            if node.get("class_type") == "LoadAudio":
+                audio_path = node.get("inputs", {}).get("audio", "")
+            if node.get("_meta", {}).get("title") == "Preview Text":
+                target = node_id
+        if target is None:
+            target = next((n for n, v in prompt.items() if v.get("class_type") == "Apply Whisper"), "98")
+        
+        self.send(client_id, {"type": "execution_start", "data": {"prompt_id": prompt_id}})
+        seconds = wav_seconds(audio_path)
+        duration = self.delay + self.rtf * seconds
+        for node_id in prompt:
+            self.send(client_id, {"type": "executing", "data": {"node": node_id, "prompt_id": prompt_id}})
+        
+        if self.interrupted.wait(duration):
+            self.send(client_id, {"type": "execution_interrupted", "data": {"prompt_id": prompt_id}})
+            return
+        if self.hang_rate and self.random.random() < self.hang_rate:
+            self.interrupted.wait()
+            return
+        if self.fail_rate and self.random.random() < self.fail_rate:
+            self.history[prompt_id] = {"outputs": {}, "status": {"status_str": "error", "completed": False}}
+            self.send(client_id, {"type": "execution_error", "data": {
+                "prompt_id": prompt_id, "node_id": target, "exception_message": "synthetic failure"}})
+            return
+        
+        text = f"fake transcript of {os.path.basename(audio_path)} ({seconds:.1f}s)"
+        self.history[prompt_id] = {"outputs": {target: {"text": [text]}},
+                                   "status": {"status_str": "success", "completed": True}}
+        self.send(client_id, {"type": "executed", "data": {"node": target, "output": {"text": [text]}, "prompt_id": prompt_id}})
+        self.send(client_id, {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+
+    def queue_state(self):
+        with self.cond:
+            running = [[0, self.running, {}, {}, []]] if self.running else []
+            pending = [[i + 1, pid, {}, {}, []] for i, (pid, _, _) in enumerate(self.pending)]
+        return {"queue_running": running, "queue_pending": pending}
+
+    def delete(self, prompt_ids):
+        with self.cond:
+            self.pending = [p for p in self.pending if p[0] not in prompt_ids]
+
+    def interrupt(self, prompt_id=None):
+        if prompt_id is None or prompt_id == self.running:
+            self.interrupted.set()
+
+    # --- Server ---
+    def start(self, host="127.0.0.1", port=0):
+        self.httpd = _Server((host, port), _make_handler(self))
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self.httpd.server_address[1]
+
+    def stop(self):
+        if self.httpd: self.httpd.shutdown()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"{host}:{port}"
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def _make_handler(fake):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, obj, status=200):
+            body = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            path = urllib.parse.urlparse(self.path)
+            if path.path == "/ws":
+                return self.websocket(urllib.parse.parse_qs(path.query).get("clientId", [""])[0])
+            if path.path == "/queue":
+                return self.reply(fake.queue_state())
+            if path.path.startswith("/history/"):
+                prompt_id = path.path[len("/history/"):]
+                entry = fake.history.get(prompt_id)
+                return self.reply({prompt_id: entry} if entry else {})
+            if path.path == "/system_stats":
+                return self.reply({"system": {"os": "fake", "comfyui_version": "fake"},
+                                   "devices": [{"name": "fake", "type": "cpu"}]})
+            if path.path.startswith("/object_info"):
+                info = {"Apply Whisper": {"input": {"required": {"language": ["COMBO", {"choices": LANGUAGES}]}}}}
+                node = urllib.parse.unquote(path.path[len("/object_info/"):]) if path.path.startswith("/object_info/") else None
+                if node:
+                    return self.reply({node: info[node]} if node in info else {})
+                return self.reply(info)
+            self.reply({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path == "/prompt":
+                data = self.read_json()
+                prompt_id = fake.submit(data.get("prompt", {}), data.get("client_id", ""))
+                return self.reply({"prompt_id": prompt_id, "number": 0, "node_errors": {}})
+            if self.path == "/queue":
+                fake.delete(self.read_json().get("delete", []))
+                return self.reply({})
+            if self.path == "/interrupt":
+                fake.interrupt(self.read_json().get("prompt_id"))
+                return self.reply({})
+            self.reply({"error": "not found"}, 404)
+
+        def websocket(self, client_id):
+            key = self.headers.get("Sec-WebSocket-Key", "")
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+            self.send_response(101, "Switching Protocols")
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.wfile.flush()
+            
+            conn = WsConnection(self.wfile)
+            fake.clients[client_id] = conn
+            conn.send({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": len(fake.pending)}}, "sid": client_id}})
+            try:
+                # Drain client frames until close/EOF; we never need their content
+                while True:
+                    head = self.rfile.read(2)
+                    if len(head) < 2: break
+                    opcode = head[0] & 0x0F
+                    n = head[1] & 0x7F
+                    if n == 126: n = struct.unpack(">H", self.rfile.read(2))[0]
+                    elif n == 127: n = struct.unpack(">Q", self.rfile.read(8))[0]
+                    if head[1] & 0x80: self.rfile.read(4)
+                    self.rfile.read(n)
+                    if opcode == 0x8: break
+            finally:
+                conn.open = False
+                if fake.clients.get(client_id) is conn:
+                    del fake.clients[client_id]
+                self.close_connection = True
+
+        def log_message(self, format, *args):
+            return
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--delay", type=float, default=0.2, help="fixed execution time per prompt (s)")
+    parser.add_argument("--rtf", type=float, default=0.0, help="extra execution time per second of audio")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of prompts that send execution_error")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of prompts that never finish")
+    args = parser.parse_args()
+    fake = FakeComfy(args.delay, args.rtf, args.fail_rate, hang_rate=args.hang_rate)
+    fake.start(args.host, args.port)
+    print(f"Fake ComfyUI listening on {fake.url}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Minimal stand-in for the `sounddevice` module used by src/audio.py.
+
+InputStream runs a producer thread that calls the stream callback with
+synthetic float32 blocks, either paced at `speed` x real time or, with
+speed=0, as fast as the consumer keeps up. Install it with install()
+before importing src.audio.
+"""
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+# Settings for streams opened after they are changed
+speed = 1.0
+max_queued_blocks = 64 # Backpressure for speed=0 so memory stays bounded
+
+class _Status:
+    input_overflow = False
+
+class _TimeInfo:
+    def __init__(self, adc):
+        self.inputBufferAdcTime = adc
+
+def make_block(frames, index, samplerate):
+    """Loud 220 Hz tone (always above the VAD threshold) with a little noise."""
+    t = (np.arange(frames) + index * frames) / samplerate
+    block = 0.3 * np.sin(2 * np.pi * 220 * t) + np.random.normal(0, 0.01, frames)
+    return block.astype(np.float32).reshape(-1, 1)
+
+class InputStream:
+    def __init__(self, samplerate=16000, channels=1, device=None, blocksize=1600,
+                 latency=None, callback=None, finished_callback=None, **kwargs):
+        self.samplerate = samplerate
+        self.blocksize = blocksize or 1600
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.speed = speed
+        self.active = False
+        self.blocks_sent = 0
+        self.consumer = None # Optional callable returning blocks consumed, for speed=0
+        # Pre-generate a second of blocks and cycle them, so generation cost isn't measured
+        self.pool = [make_block(self.blocksize, i, samplerate) for i in range(max(1, samplerate // self.blocksize))]
+        self.thread = None
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        period = self.blocksize / float(self.samplerate)
+        t0 = time.perf_counter()
+        status = _Status()
+        while self.active:
+            block = self.pool[self.blocks_sent % len(self.pool)]
+            self.callback(block, self.blocksize, _TimeInfo(t0 + self.blocks_sent * period), status)
+            self.blocks_sent += 1
+            if self.speed > 0:
+                delay = t0 + self.blocks_sent * period / self.speed - time.perf_counter()
+                if delay > 0: time.sleep(delay)
+            elif self.consumer:
+                while self.active and self.blocks_sent - self.consumer() > max_queued_blocks:
+                    time.sleep(0.0005)
+        if self.finished_callback:
+            self.finished_callback()
+
+    def stop(self):
+        self.active = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+
+    def close(self):
+        self.stop()
+
+def query_devices(device=None, kind=None):
+    devices = [{'name': 'Fake Mic', 'hostapi': 0, 'max_input_channels': 1}]
+    if device is not None: return devices[device]
+    if kind == 'input': return devices[0]
+    return devices
+
+def query_hostapis(index=None):
+    hostapis = [{'name': 'Fake API', 'devices': [0]}]
+    return hostapis if index is None else hostapis[index]
+
+def install():
+    module = types.ModuleType("sounddevice")
+    module.InputStream = InputStream
+    module.query_devices = query_devices
+    module.query_hostapis = query_hostapis
+    module.default = types.SimpleNamespace(device=[0, 0])
+    module._terminate = lambda: None
+    module._initialize = lambda: None
+    sys.modules["sounddevice"] = module
+    return module
@@ -0,0 +1,67 @@
+"""Import-time profile of the app's startup path (`python -X importtime`).
+
+Imports voice_inputter in a fresh interpreter, prints the slowest modules by
+cumulative time and fails (exit code 1) when a lazily loaded subsystem is
+imported at startup or, if --budget is given, the total exceeds it (seconds).
+Without --budget the total is only reported, e.g. on noisy CI runners.
+
+  python benchmarks/importtime.py
+  python benchmarks/importtime.py --budget 0.8 --log importtime.log
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only (chat/network modes, paste, hotkey listener)
+LAZY_MODULES = ["telegram", "nio", "src.codec", "pyautogui", "pyperclip", "pynput",
+                "src.network", "src.matrix_client", "src.telegram_client"]
+
+def profile(module):
+    """Returns [(name, self_us, cumulative_us, depth)] in import order."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line: continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows, proc.stderr
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="voice_inputter")
+    parser.add_argument("--budget", type=float, help="Max total import time in seconds (default: report only)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--log", help="Write the raw -X importtime output here")
+    args = parser.parse_args()
+    
+    rows, raw = profile(args.module)
+    if args.log:
+        with open(args.log, "w") as f: f.write(raw)
+    
+    total = sum(r[1] for r in rows) / 1e6
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us, depth in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    budget = f" (budget {args.budget * 1000:.0f} ms)" if args.budget is not None else ""
+    print(f"Total: {total * 1000:.0f} ms over {len(rows)} modules{budget}")
+    
+    loaded = {r[0] for r in rows}
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    failed = False
+    if eager:
+        print(f"Lazy modules imported at startup: {', '.join(eager)}")
+        failed = True
+    if args.budget is not None and total > args.budget:
+        print("Import time over budget")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
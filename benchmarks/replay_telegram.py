@@ -0,0 +1,90 @@
+"""Replay recorded Telegram updates against the bot's webhook endpoint.
+
+Run the app with TELEGRAM_MODE = "webhook" and a fixed TELEGRAM_WEBHOOK_SECRET
+(leave TELEGRAM_WEBHOOK_URL empty to serve locally only), then post updates
+exactly as Telegram would and report status counts and latency:
+
+  python benchmarks/replay_telegram.py updates.jsonl --secret s3cret --repeat 10 --concurrency 4
+  python benchmarks/replay_telegram.py --chats 5 --repeat 20 --secret s3cret   # synthetic text updates
+
+The input is a JSON file holding one update, a list of updates (e.g. the
+"result" of getUpdates) or one update per line.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+from src.config import TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_PORT
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict) and "result" in data:
+        data = data["result"]
+    return data if isinstance(data, list) else [data]
+
+def text_update(update_id, chat_id):
+    chat = {"id": chat_id, "type": "private", "first_name": "Replay"}
+    return {"update_id": update_id,
+            "message": {"message_id": update_id, "date": int(time.time()), "chat": chat,
+                        "from": {"id": chat_id, "is_bot": False, "first_name": "Replay"},
+                        "text": f"replayed update {update_id}"}}
+
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("updates", nargs="?", help="recorded updates (JSON / JSON lines); default: synthetic text")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{TELEGRAM_WEBHOOK_PORT}{TELEGRAM_WEBHOOK_PATH}")
+    parser.add_argument("--secret", default="", help="TELEGRAM_WEBHOOK_SECRET of the running app")
+    parser.add_argument("--chats", type=int, default=3, help="chats for synthetic updates")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--insecure", action="store_true", help="don't verify a self-signed HTTPS cert")
+    args = parser.parse_args()
+
+    base = load_updates(args.updates) if args.updates else \
+        [text_update(i + 1, 1000 + i) for i in range(args.chats)]
+    updates = []
+    for r in range(args.repeat):
+        for u in base:
+            # Fresh update_ids, as Telegram never sends the same one twice
+            updates.append(dict(u, update_id=u.get("update_id", 0) + r * len(base)))
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret}
+    statuses, latencies = {}, []
+
+    def post(update):
+        t0 = time.perf_counter()
+        try:
+            status = requests.post(args.url, json=update, headers=headers, timeout=10, verify=not args.insecure).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        latencies.append(time.perf_counter() - t0)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(post, updates))
+    wall = time.perf_counter() - t0
+    ms = [v * 1000 for v in latencies]
+    print(f"updates={len(updates)}  statuses={statuses}  wall_s={wall:.3f}  "
+          f"p50_ms={percentile(ms, 50):.1f}  p95_ms={percentile(ms, 95):.1f}")
+    return 0 if statuses.get(200) == len(updates) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
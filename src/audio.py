@@ -1,177 +1,395 @@
 import threading
+import queue
+import collections
 import time
+import wave
 import numpy as np
 import sounddevice as sd
-from .config import SAMPLE_RATE, VAD_THRESHOLD, VAD_SILENCE_DURATION
+from .config import SAMPLE_RATE, VAD_THRESHOLD, VAD_SILENCE_DURATION, AUDIO_FALLBACK_DEVICE
+from .metrics import TIMINGS
+from .tasks import new_id
 
-class AudioManager:
-    def __init__(self, request_queue, logger):
-        self.queue = request_queue
+BLOCK_DURATION = 0.1
+BLOCK_SIZE = int(SAMPLE_RATE * BLOCK_DURATION)
+PREROLL_BLOCKS = 3 # Audio kept before a voice trigger so the onset isn't clipped
+PRIMARY_SOURCE = "default"
+
+# Xrun handling: this many overflows within the window grows block size/latency
+XRUN_LIMIT = 3
+XRUN_WINDOW = 10.0
+MAX_BLOCK_SIZE = BLOCK_SIZE * 4
+
+# Silence needed before a speculative transcription is kicked off (skips short word gaps)
+SPECULATIVE_DELAY = 0.3
+
+def to_int16(audio_data):
+    """Concatenate captured float32 blocks into one int16 PCM array."""
+    audio_array = np.concatenate(audio_data, axis=0)
+    return (audio_array * 32767).astype(np.int16)
+
+def write_wav(filename, audio_data, sample_rate=SAMPLE_RATE):
+    with wave.open(filename, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(to_int16(audio_data).tobytes())
+
+class DeviceManager:
+    """Caches the PortAudio device table. PortAudio only sees hot-plugged
+    devices after a reinitialization, so re-querying is done on rescan().
+    Reinitializing renumbers the devices, so sources hold a device key
+    (name, host API name) and look the current index up when opening."""
+    def __init__(self, logger):
         self.logger = logger
-        self.audio_data = []
+        # Guards PortAudio itself: stream open/close and reinitialization
+        self.lock = threading.RLock()
+        self.devices = None
+        self.hostapis = []
+        self.fallback_name = AUDIO_FALLBACK_DEVICE or None # None -> system default input
+        self.owners = [] # CaptureSources whose streams must close before a rescan
+
+    def query(self, refresh=False):
+        with self.lock:
+            if self.devices is None or refresh:
+                try:
+                    self.devices = list(sd.query_devices())
+                    self.hostapis = list(sd.query_hostapis())
+                except Exception as e:
+                    self.logger.error(f"Error querying devices: {e}")
+                    return []
+            return self.devices
+
+    def rescan(self):
+        with self.lock:
+            # PortAudio cannot be reinitialized with open streams; owners reopen on their next loop
+            for owner in list(self.owners):
+                owner.close_stream()
+            try:
+                sd._terminate()
+                sd._initialize()
+            except Exception as e:
+                self.logger.error(f"PortAudio reinitialization failed: {e}")
+            self.devices = None
+            devices = self.query()
+        self.logger.info(f"Device rescan found {len(devices)} devices")
+        return devices
+
+    def get_input_devices(self):
+        input_devices = []
+        seen_names = set()
+        for i, d in enumerate(self.query()):
+            if d['max_input_channels'] > 0:
+                # De-duplicate by name to avoid showing same device across multiple APIs
+                if d['name'] not in seen_names:
+                    input_devices.append((i, d['name']))
+                    seen_names.add(d['name'])
+        return input_devices
+
+    def _key(self, d):
+        try: hostapi = self.hostapis[d['hostapi']]['name']
+        except (KeyError, IndexError, TypeError): hostapi = None
+        return (d['name'], hostapi)
+
+    def key(self, index):
+        """Device key for an index of the current table (None -> system default)."""
+        if index is None: return None
+        devices = self.query()
+        if 0 <= index < len(devices):
+            return self._key(devices[index])
+        return None
+
+    def resolve(self, key):
+        """Current index of an input device key, or None if it is gone (or the key is None)."""
+        if key is None: return None
+        with self.lock:
+            for i, d in enumerate(self.query()):
+                if d['max_input_channels'] > 0 and self._key(d) == key:
+                    return i
+        return None
+
+    def is_available(self, key):
+        return key is None or self.resolve(key) is not None
+
+    def get_name(self, index):
+        if index is None:
+            try: index = sd.default.device[0]
+            except: index = -1
+            if index is None or index < 0: return "Default"
+        devices = self.query()
+        if 0 <= index < len(devices):
+            return devices[index]['name']
+        return f"Index {index}"
+
+    def key_name(self, key):
+        return self.get_name(None) if key is None else key[0]
+
+    def pick_fallback(self, lost_key):
+        """Key of the AUDIO_FALLBACK_DEVICE input if present, else None (system default)."""
+        if self.fallback_name:
+            for d in self.query():
+                key = self._key(d)
+                if d['max_input_channels'] > 0 and d['name'] == self.fallback_name and key != lost_key:
+                    return key
+        return None
+
+class CaptureSource:
+    """One microphone with its own stream, pre-roll ring buffer, VAD state and
+    queue of finished recordings. VAD settings are shared via the AudioManager."""
+    def __init__(self, manager, name, device_index=None, always_listen=False):
+        self.manager = manager
+        self.name = name
+        self.logger = manager.logger
+        self.devices = manager.devices
+        self.device_key = self.devices.key(device_index)
+        self.device_changed = False
+        self.always_listen = always_listen # Extra mics are voice-triggered regardless of the global setting
+        
         self.state = "READY"
+        self.audio_data = []
+        self.preroll = collections.deque(maxlen=PREROLL_BLOCKS)
+        self.recordings = queue.Queue() # Finished audio_data lists, drained by the coordinator
+        
+        # Stream (opened/closed under devices.lock)
+        self.block_size = BLOCK_SIZE
+        self.latency = None # None -> PortAudio default
+        self.stream = None
+        self.stream_token = None
+        self.blocks = queue.Queue()
+        self.stream_lost = threading.Event()
+        
+        # Xrun accounting (per recording, plus running totals)
+        self.xrun_times = collections.deque()
+        self.rec_overflows = 0
+        self.rec_dropped_frames = 0
+        self.rec_started_at = time.time()
+        self.rec_id = new_id() # Becomes the Recording's id, keying its timing spans
+        self.total_overflows = 0
+        self.total_dropped_frames = 0
         
         # Flags
         self.manual_start_event = threading.Event()
         self.manual_stop_event = threading.Event()
         self.running = True
         
-        # Settings
-        self.use_auto_stop = True
-        self.use_voice_trigger = False
-        self.silence_duration = VAD_SILENCE_DURATION
-        self.threshold = VAD_THRESHOLD
-        self.device_index = None
-        self.device_changed = False
-        
-        # Start Loop
-        self.thread = threading.Thread(target=self.audio_loop, daemon=True)
+        self.devices.owners.append(self)
+        self.thread = threading.Thread(target=self.capture_loop, daemon=True)
         self.thread.start()
 
     def stop(self):
         self.running = False
-        if self.thread.is_alive():
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
             try:
                 self.thread.join(timeout=1.0)
             except: pass
+        try: self.devices.owners.remove(self)
+        except ValueError: pass
 
-    def update_settings(self, auto_stop, voice_trigger, silence_duration=None, threshold=None):
-        self.use_auto_stop = auto_stop
-        self.use_voice_trigger = voice_trigger
-        if silence_duration is not None:
-            try:
-                self.silence_duration = float(silence_duration)
-            except: pass
-        if threshold is not None:
-            try:
-                self.threshold = float(threshold)
-            except: pass
-
-    def get_devices(self):
-        try:
-            devices = sd.query_devices()
-            input_devices = []
-            seen_names = set()
-            for i, d in enumerate(devices):
-                if d['max_input_channels'] > 0:
-                    # De-duplicate by name to avoid showing same device across multiple APIs
-                    if d['name'] not in seen_names:
-                        input_devices.append((i, d['name']))
-                        seen_names.add(d['name'])
-            return input_devices
-        except Exception as e:
-            self.logger.error(f"Error querying devices: {e}")
-            return []
+    @property
+    def device_index(self):
+        """Index of the device in the current PortAudio table (None -> default or gone)."""
+        return self.devices.resolve(self.device_key)
 
     def set_device(self, index):
-        self.device_index = index
+        self.device_key = self.devices.key(index)
         self.device_changed = True
-        self.logger.info(f"Selected audio device index: {index}")
 
-    def set_state(self, state):
-        self.state = state
+    def voice_trigger_enabled(self):
+        return self.always_listen or self.manager.use_voice_trigger
 
-    def trigger_start(self):
-        if self.state == "READY":
-            self.manual_start_event.set()
+    # --- Stream ---
+    def open_stream(self):
+        with self.devices.lock:
+            index = self.devices.resolve(self.device_key)
+            if self.device_key is not None and index is None:
+                # Unplugged while the stream was closed (e.g. found by a rescan)
+                self.fall_back()
+                index = self.devices.resolve(self.device_key)
+                self.manager.queue.put("scan_mics")
+            token = object()
+            blocks = queue.Queue()
+            block_size = self.block_size
+            last_adc = [None]
+            
+            def callback(indata, frames, time_info, status):
+                # Estimate frames lost from the ADC timestamp gap; fall back to one block
+                dropped = 0
+                adc = time_info.inputBufferAdcTime
+                if adc and last_adc[0]:
+                    gap = int(round((adc - last_adc[0]) * SAMPLE_RATE)) - block_size
+                    if gap > block_size // 2: dropped = gap
+                if status.input_overflow and not dropped:
+                    dropped = frames
+                last_adc[0] = adc
+                blocks.put((indata.copy(), bool(status.input_overflow), dropped))
+            
+            def finished():
+                # Fires on normal close too; only an unexpected end means the device is gone
+                if self.stream_token is token:
+                    self.stream_lost.set()
+            
+            self.stream_lost.clear()
+            stream = sd.InputStream(samplerate=SAMPLE_RATE, channels=1, device=index,
+                                    blocksize=block_size, latency=self.latency,
+                                    callback=callback, finished_callback=finished)
+            self.stream_token = token
+            # Blocks of the previous stream not yet read (reopen after xruns, failover or a
+            # rescan) go first, so the running recording or pre-roll keeps them
+            while True:
+                try: blocks.put(self.blocks.get_nowait())
+                except queue.Empty: break
+            self.blocks = blocks
+            stream.start()
+            self.stream = stream
+        self.logger.info(f"[{self.name}] Audio Stream Started (Device: {self.devices.key_name(self.device_key)})")
 
-    def trigger_stop(self):
+    def close_stream(self):
+        with self.devices.lock:
+            stream = self.stream
+            self.stream = None
+            self.stream_token = None
+            if stream:
+                try:
+                    stream.stop()
+                    stream.close()
+                except: pass
+
+    def failover(self):
+        """Device vanished: reinitialize PortAudio and switch to the fallback/default
+        input. audio_data is left untouched so the current recording continues."""
+        with self.devices.lock:
+            self.close_stream()
+            self.devices.rescan()
+            if self.device_key is None or not self.devices.is_available(self.device_key):
+                self.fall_back()
+            self.open_stream()
+        self.manager.queue.put("scan_mics")
+
+    def fall_back(self):
+        lost_key = self.device_key
+        self.device_key = self.devices.pick_fallback(lost_key)
+        self.logger.warning(f"[{self.name}] Audio device {self.devices.key_name(lost_key)} lost, failing over to "
+                            f"{self.devices.key_name(self.device_key)}")
+
+    def note_xrun(self, overflow, dropped):
         if self.state == "RECORDING":
-            self.manual_stop_event.set()
+            self.rec_overflows += int(overflow)
+            self.rec_dropped_frames += dropped
+        self.total_overflows += int(overflow)
+        self.total_dropped_frames += dropped
+        
+        now = time.time()
+        self.xrun_times.append(now)
+        while self.xrun_times and now - self.xrun_times[0] > XRUN_WINDOW:
+            self.xrun_times.popleft()
+        
+        if len(self.xrun_times) >= XRUN_LIMIT and self.block_size < MAX_BLOCK_SIZE:
+            # Repeated xruns: give PortAudio more headroom. The stream is reopened on
+            # the next loop; audio_data is kept so the recording continues.
+            self.block_size = min(self.block_size * 2, MAX_BLOCK_SIZE)
+            self.latency = 2 * self.block_size / SAMPLE_RATE
+            self.xrun_times.clear()
+            self.logger.warning(f"[{self.name}] Repeated audio overflows, raising block size to "
+                                f"{self.block_size} frames (latency {self.latency:.2f}s)")
+            self.close_stream()
 
-    def audio_loop(self):
+    # --- Capture ---
+    def capture_loop(self):
         silence_start = None
         has_spoken = False
-        stream = None
+        speculating = False
         
-        while self.running:
+        while self.running and self.manager.running:
             # Check device change
             if self.device_changed:
-                if stream:
-                    try:
-                        stream.stop()
-                        stream.close()
-                    except: pass
-                    stream = None
+                self.close_stream()
                 self.device_changed = False
 
-            # Determine if we need stream
+            # Explicit rescan is serviced by the primary source only
+            if self.name == PRIMARY_SOURCE and self.manager.rescan_event.is_set():
+                self.manager.rescan_event.clear()
+                self.devices.rescan()
+                self.manager.queue.put("scan_mics")
+
             # We need stream if RECORDING, or if READY and Voice Trigger is enabled
             need_stream = (self.state == "RECORDING") or \
-                          (self.state == "READY" and self.use_voice_trigger)
+                          (self.state == "READY" and self.voice_trigger_enabled())
 
             # Manage Stream State
-            if need_stream and stream is None:
+            if need_stream and self.stream is None:
                 try:
-                    stream = sd.InputStream(samplerate=SAMPLE_RATE, channels=1, device=self.device_index)
-                    stream.start()
-                    
-                    device_name = "Default"
-                    if self.device_index is not None:
-                        try:
-                            device_name = sd.query_devices(self.device_index)['name']
-                        except:
-                            device_name = f"Index {self.device_index}"
-                    else:
-                        try:
-                            # query default input device
-                            device_name = sd.query_devices(kind='input')['name']
-                        except: pass
-
-                    self.logger.info(f"Audio Stream Started (Device: {device_name})")
+                    self.open_stream()
                 except Exception as e:
-                    self.logger.error(f"Failed to start stream with device {self.device_index}: {e}")
+                    self.logger.error(f"[{self.name}] Failed to start stream with device {self.devices.key_name(self.device_key)}: {e}")
+                    self.close_stream()
                     time.sleep(1)
                     continue
             
-            elif not need_stream and stream is not None:
-                try:
-                    stream.stop()
-                    stream.close()
-                except: pass
-                stream = None
-                self.logger.info("Audio Stream Stopped")
+            elif not need_stream and self.stream is not None:
+                self.close_stream()
+                self.preroll.clear()
+                self.blocks = queue.Queue() # Leftovers are stale by the time a stream is needed again
+                self.logger.info(f"[{self.name}] Audio Stream Stopped")
 
             # Processing
-            if stream:
+            if self.stream is not None:
                 try:
-                    indata, overflow = stream.read(int(SAMPLE_RATE * 0.1))
-                    if overflow: pass
-                    
-                    amplitude = np.sqrt(np.mean(indata**2))
+                    try:
+                        # A healthy stream delivers a block every block_size frames
+                        indata, overflow, dropped = self.blocks.get(timeout=self.block_size / SAMPLE_RATE)
+                    except queue.Empty:
+                        indata = None
+                        stream = self.stream
+                        if self.stream_lost.is_set() or (stream is not None and not stream.active):
+                            self.failover()
                     
-                    # Logic based on state
-                    if self.state == "READY":
-                        if self.use_voice_trigger and amplitude > self.threshold:
-                            self.logger.info("Voice trigger detected!")
-                            self.start_recording()
-                            self.audio_data.append(indata.copy())
-                            has_spoken = True
-                            silence_start = None
-
-                    elif self.state == "RECORDING":
-                        self.audio_data.append(indata.copy())
+                    if indata is not None:
+                        if overflow or dropped:
+                            self.note_xrun(overflow, dropped)
                         
-                        if self.use_auto_stop:
-                            if amplitude > self.threshold:
-                                silence_start = None
+                        amplitude = np.sqrt(np.mean(indata**2))
+                        
+                        # Logic based on state
+                        if self.state == "READY":
+                            if self.voice_trigger_enabled() and amplitude > self.manager.threshold:
+                                self.logger.info(f"[{self.name}] Voice trigger detected!")
+                                self.start_recording()
+                                self.audio_data.append(indata)
                                 has_spoken = True
-                            elif has_spoken:
-                                if silence_start is None:
-                                    silence_start = time.time()
-                                elif time.time() - silence_start > self.silence_duration:
-                                    self.logger.info("Silence auto-stop.")
-                                    self.stop_recording()
+                                silence_start = None
+                            else:
+                                self.preroll.append(indata)
+
+                        elif self.state == "RECORDING":
+                            self.audio_data.append(indata)
+                            
+                            if self.manager.use_auto_stop or self.always_listen:
+                                if amplitude > self.manager.threshold:
+                                    if speculating:
+                                        # Speech resumed, the speculative result is stale
+                                        self.manager.queue.put(("speculative_cancel", self.name))
+                                        speculating = False
                                     silence_start = None
-                                    has_spoken = False
+                                    has_spoken = True
+                                elif has_spoken:
+                                    if silence_start is None:
+                                        silence_start = time.time()
+                                    elif time.time() - silence_start > self.manager.silence_duration:
+                                        self.logger.info(f"[{self.name}] Silence auto-stop.")
+                                        self.stop_recording()
+                                        silence_start = None
+                                        has_spoken = False
+                                        speculating = False
+                                    elif not speculating and self.manager.use_speculative and \
+                                            time.time() - silence_start > SPECULATIVE_DELAY:
+                                        # Ship what we have now; the rest of the recording is silence
+                                        # unless speech resumes (which cancels this job)
+                                        self.manager.queue.put(("speculative_start", self.name, list(self.audio_data), self.rec_id))
+                                        speculating = True
                                     
                 except Exception as e:
-                    self.logger.error(f"Audio read error: {e}")
+                    self.logger.error(f"[{self.name}] Audio read error: {e}")
                     # If error, close stream to retry
-                    try:
-                        stream.close()
-                    except: pass
-                    stream = None
+                    self.close_stream()
                     time.sleep(1)
             else:
                 # Idle loop when no stream needed
@@ -187,19 +405,134 @@ class AudioManager:
                 self.manual_stop_event.clear()
                 if self.state == "RECORDING":
                     self.stop_recording()
+                    silence_start = None
+                    has_spoken = False
+                    speculating = False
 
         # Cleanup on exit
-        if stream:
-            try:
-                stream.stop()
-                stream.close()
-            except: pass
+        self.close_stream()
 
     def start_recording(self):
-        self.audio_data = []
-        self.queue.put(("audio_state", "RECORDING"))
-        self.logger.info("Audio Recording Started")
+        # Seed with the pre-roll so a voice-triggered start keeps its first syllable
+        self.audio_data = list(self.preroll)
+        self.preroll.clear()
+        self.rec_overflows = 0
+        self.rec_dropped_frames = 0
+        self.rec_started_at = time.time()
+        self.rec_id = new_id()
+        self.state = "RECORDING"
+        self.manager.queue.put(("audio_state", "RECORDING", self.name))
+        self.logger.info(f"[{self.name}] Audio Recording Started")
 
     def stop_recording(self):
-        self.queue.put("recording_finished")
-        self.logger.info("Audio Recording Stopped")
+        now = time.time()
+        TIMINGS.record("capture", now - self.rec_started_at, self.rec_id)
+        stats = {'overflows': self.rec_overflows, 'dropped_frames': self.rec_dropped_frames,
+                 'block_size': self.block_size, 'stopped_at': now, 'id': self.rec_id}
+        if self.rec_overflows or self.rec_dropped_frames:
+            self.logger.warning(f"[{self.name}] Recording had {self.rec_overflows} overflows, "
+                                f"~{self.rec_dropped_frames} frames dropped")
+        self.recordings.put((self.audio_data, stats))
+        self.audio_data = []
+        self.state = "READY"
+        self.manager.queue.put(("recording_finished", self.name))
+        self.logger.info(f"[{self.name}] Audio Recording Stopped")
+
+class AudioManager:
+    """Set of capture sources. The primary source follows the GUI (hotkey, mic
+    selection); extra sources are voice-triggered and record independently."""
+    def __init__(self, request_queue, logger):
+        self.queue = request_queue
+        self.logger = logger
+        self.devices = DeviceManager(logger)
+        self.rescan_event = threading.Event()
+        self.running = True
+        
+        # Settings (shared by all sources)
+        self.use_auto_stop = True
+        self.use_voice_trigger = False
+        self.use_speculative = False
+        self.silence_duration = VAD_SILENCE_DURATION
+        self.threshold = VAD_THRESHOLD
+        
+        self.sources = {}
+        self.primary = self.add_source(PRIMARY_SOURCE)
+
+    def stop(self):
+        self.running = False
+        for source in list(self.sources.values()):
+            source.stop()
+
+    # --- Sources ---
+    def add_source(self, name, device_index=None):
+        if name in self.sources:
+            self.sources[name].set_device(device_index)
+            return self.sources[name]
+        source = CaptureSource(self, name, device_index, always_listen=(name != PRIMARY_SOURCE))
+        self.sources[name] = source
+        if name != PRIMARY_SOURCE:
+            self.logger.info(f"Added capture source '{name}' (Device: {self.devices.key_name(source.device_key)})")
+        return source
+
+    def remove_source(self, name):
+        if name == PRIMARY_SOURCE: return
+        source = self.sources.pop(name, None)
+        if source:
+            source.stop()
+            self.logger.info(f"Removed capture source '{name}'")
+
+    def get_source(self, name):
+        return self.sources.get(name)
+
+    def extra_sources(self):
+        return [n for n in self.sources if n != PRIMARY_SOURCE]
+
+    # --- Primary source shortcuts ---
+    @property
+    def state(self):
+        return self.primary.state
+
+    @property
+    def audio_data(self):
+        return self.primary.audio_data
+
+    @property
+    def device_index(self):
+        return self.primary.device_index
+
+    def set_state(self, state):
+        self.primary.state = state
+
+    def trigger_start(self):
+        if self.primary.state == "READY":
+            self.primary.manual_start_event.set()
+
+    def trigger_stop(self):
+        if self.primary.state == "RECORDING":
+            self.primary.manual_stop_event.set()
+
+    def set_device(self, index):
+        self.primary.set_device(index)
+        self.logger.info(f"Selected audio device index: {index}")
+
+    # --- Settings / Devices ---
+    def update_settings(self, auto_stop, voice_trigger, silence_duration=None, threshold=None, speculative=None):
+        self.use_auto_stop = auto_stop
+        self.use_voice_trigger = voice_trigger
+        if speculative is not None:
+            self.use_speculative = speculative
+        if silence_duration is not None:
+            try:
+                self.silence_duration = float(silence_duration)
+            except: pass
+        if threshold is not None:
+            try:
+                self.threshold = float(threshold)
+            except: pass
+
+    def get_devices(self):
+        return self.devices.get_input_devices()
+
+    def request_rescan(self):
+        """Re-enumerate devices on the audio thread; posts 'scan_mics' when done."""
+        self.rescan_event.set()
@@ -0,0 +1,282 @@
+import importlib.util
+import io
+import threading
+import time
+import wave
+import numpy as np
+from .config import (SAMPLE_RATE, PROCESSING_WORKERS, TRANSCRIPTION_BACKEND, LOCAL_MAX_SECONDS,
+                     LOCAL_MODEL, LOCAL_COMPUTE_TYPE, LOCAL_THREADS, WARMUP_CLIP_SECONDS,
+                     WARMUP_IDLE_SECONDS, KEEPALIVE_INTERVAL, KEEPALIVE_HOURS)
+from .metrics import TIMINGS, wav_seconds
+
+# GUI language names (ComfyUI's Apply Whisper choices) -> Whisper language codes
+LANGUAGE_CODES = {
+    "english": "en", "german": "de", "french": "fr", "italian": "it", "spanish": "es",
+    "japanese": "ja", "chinese": "zh", "portuguese": "pt", "dutch": "nl", "russian": "ru",
+    "polish": "pl", "turkish": "tr", "korean": "ko", "arabic": "ar", "swedish": "sv",
+    "czech": "cs", "ukrainian": "uk", "danish": "da", "finnish": "fi", "norwegian": "no",
+    "greek": "el", "hungarian": "hu", "romanian": "ro", "hindi": "hi", "hebrew": "he",
+}
+
+def read_pcm16(source):
+    """(int16 samples, sample rate) from a WAV path or file object; stereo is downmixed."""
+    with wave.open(source, 'rb') as wf:
+        channels, rate = wf.getnchannels(), wf.getframerate()
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"Unsupported WAV sample width {wf.getsampwidth()}")
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, rate
+
+def write_pcm16(target, samples, sample_rate=SAMPLE_RATE):
+    with wave.open(target, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
+
+def silence(seconds=WARMUP_CLIP_SECONDS, sample_rate=SAMPLE_RATE):
+    return np.zeros(int(seconds * sample_rate), dtype=np.int16)
+
+def wav_bytes(samples, sample_rate=SAMPLE_RATE):
+    bio = io.BytesIO()
+    write_pcm16(bio, samples, sample_rate)
+    return bio.getvalue()
+
+class TranscriptionBackend:
+    """Speech-to-text engine. transcribe() takes either a WAV path or an int16
+    sample buffer and returns the text ("" when cancelled, None on failure).
+    Implementations must be safe to call from several workers at once."""
+    name = "backend"
+
+    def available(self):
+        return True
+
+    def transcribe(self, audio_path=None, audio=None, sample_rate=SAMPLE_RATE, language="auto",
+                   job_id=None, source=None):
+        raise NotImplementedError
+
+    def cancel(self, job_id):
+        """Stop an in-flight job; False if this backend isn't running it."""
+        return False
+
+    def warm_up(self):
+        """Run a short silent clip so the model is loaded before real audio arrives."""
+        self.transcribe(audio=silence(), job_id=f"warmup-{self.name}", source="warmup")
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """In-process faster-whisper (CTranslate2) on the CPU with int8 weights. The
+    model loads on first use; faster-whisper is an optional dependency."""
+    name = "local"
+
+    def __init__(self, logger, model=LOCAL_MODEL, compute_type=LOCAL_COMPUTE_TYPE, threads=LOCAL_THREADS):
+        self.logger = logger
+        self.model_name = model
+        self.compute_type = compute_type
+        self.threads = threads
+        self.model = None
+        self.load_lock = threading.Lock()
+        # Jobs in flight; cancelled ones are checked between segments
+        self.active = {} # job_id -> cancelled flag
+        self.active_lock = threading.Lock()
+
+    def available(self):
+        return importlib.util.find_spec("faster_whisper") is not None
+
+    def load(self):
+        with self.load_lock:
+            if self.model is None:
+                from faster_whisper import WhisperModel
+                self.logger.info(f"Loading local Whisper model {self.model_name} ({self.compute_type}, CPU)")
+                self.model = WhisperModel(self.model_name, device="cpu", compute_type=self.compute_type,
+                                          cpu_threads=self.threads, num_workers=PROCESSING_WORKERS)
+            return self.model
+
+    def transcribe(self, audio_path=None, audio=None, sample_rate=SAMPLE_RATE, language="auto",
+                   job_id=None, source=None):
+        if audio is None:
+            audio, sample_rate = read_pcm16(audio_path)
+        samples = np.asarray(audio, dtype=np.float32).reshape(-1) / 32768.0
+        if sample_rate != SAMPLE_RATE:
+            # Whisper expects 16 kHz; linear interpolation is enough for speech
+            n = int(len(samples) * SAMPLE_RATE / sample_rate)
+            samples = np.interp(np.linspace(0, len(samples) - 1, n), np.arange(len(samples)), samples).astype(np.float32)
+        code = LANGUAGE_CODES.get((language or "auto").lower())
+        
+        with self.active_lock:
+            self.active[job_id] = False
+        try:
+            segments, _ = self.load().transcribe(samples, language=code, beam_size=1)
+            parts = []
+            for segment in segments: # Decoded lazily, segment by segment
+                with self.active_lock:
+                    if self.active.get(job_id): return ""
+                parts.append(segment.text)
+            return "".join(parts).strip()
+        except Exception as e:
+            self.logger.error(f"Local transcription error: {e}")
+            return None
+        finally:
+            with self.active_lock:
+                self.active.pop(job_id, None)
+
+    def cancel(self, job_id):
+        with self.active_lock:
+            if job_id not in self.active: return False
+            self.active[job_id] = True
+            return True
+
+class PeerBackend(TranscriptionBackend):
+    """Another VoiceInputter on the LAN, used while the local ComfyUI is failing.
+    get_network returns the app's NetworkManager (built lazily)."""
+    name = "peer"
+
+    def __init__(self, get_network, logger):
+        self.get_network = get_network
+        self.logger = logger
+
+    def peers(self):
+        try: return self.get_network().get_peers()
+        except Exception: return []
+
+    def available(self):
+        return bool(self.peers())
+
+    def transcribe(self, audio_path=None, audio=None, sample_rate=SAMPLE_RATE, language="auto",
+                   job_id=None, source=None):
+        if audio is not None:
+            data = wav_bytes(audio, sample_rate)
+        else:
+            with open(audio_path, 'rb') as f: data = f.read()
+        for peer in self.peers():
+            self.logger.info(f"Routing job {job_id} to LAN peer {peer}")
+            text = self.get_network().send_wav(peer, data)
+            if text is not None: return text
+        return None
+
+    def warm_up(self):
+        pass # Peers keep their own models warm
+
+class BackendRouter(TranscriptionBackend):
+    """Picks the backend for each job from TRANSCRIPTION_BACKEND: "comfy", "local",
+    or "auto" (clips up to LOCAL_MAX_SECONDS in-process, the rest to ComfyUI).
+    Without faster-whisper installed every job goes to ComfyUI. While ComfyUI's
+    circuit breaker is open, jobs go to a LAN peer if one is known (never for jobs
+    that came from a peer, so two failing hosts can't bounce audio between them)."""
+    name = "router"
+
+    def __init__(self, logger, comfy, local=None, peer=None, mode=TRANSCRIPTION_BACKEND):
+        self.logger = logger
+        self.comfy = comfy
+        self.peer = peer
+        self.local = local or LocalWhisperBackend(logger)
+        self.mode = mode
+        self.local_ok = self.local.available()
+        if mode != "comfy" and not self.local_ok:
+            self.logger.info("faster-whisper is not installed; transcribing with ComfyUI only")
+
+    def select(self, seconds, source=None):
+        if self.local_ok:
+            if self.mode == "local": return self.local
+            if self.mode == "auto" and seconds is not None and seconds <= LOCAL_MAX_SECONDS: return self.local
+        if not self.comfy.available() and self.peer and source != "lan" and self.peer.available():
+            return self.peer
+        return self.comfy
+
+    def transcribe(self, audio_path=None, audio=None, sample_rate=SAMPLE_RATE, language="auto",
+                   job_id=None, source=None):
+        seconds = len(audio) / float(sample_rate) if audio is not None else wav_seconds(audio_path)
+        backend = self.select(seconds, source)
+        text = backend.transcribe(audio_path, audio, sample_rate, language, job_id, source)
+        if text is None and backend is self.local and self.mode == "auto":
+            # Local engine failed (model download, bad input); ComfyUI is still there
+            text = self.comfy.transcribe(audio_path, audio, sample_rate, language, job_id, source)
+        return text
+
+    def cancel(self, job_id):
+        return self.local.cancel(job_id) or self.comfy.cancel(job_id)
+
+    def in_use(self):
+        """Backends jobs can be routed to with the current mode."""
+        if not self.local_ok or self.mode == "comfy": return [self.comfy]
+        if self.mode == "local": return [self.local]
+        return [self.local, self.comfy]
+
+    def warm_up(self):
+        for backend in self.in_use():
+            try: backend.warm_up()
+            except Exception as e: self.logger.error(f"Warm-up of {backend.name} failed: {e}")
+
+class KeepAlive:
+    """Keeps the transcription models resident: warms the backend at startup, when
+    recording starts after a long idle period (poke) and, during KEEPALIVE_HOURS,
+    whenever nothing was transcribed for KEEPALIVE_INTERVAL seconds."""
+    def __init__(self, backend, logger, interval=KEEPALIVE_INTERVAL, idle=WARMUP_IDLE_SECONDS, hours=KEEPALIVE_HOURS):
+        self.backend = backend
+        self.logger = logger
+        self.interval = interval
+        self.idle = idle
+        self.hours = hours
+        self.last_activity = 0.0 # Never -> warm at startup
+        self.wake = threading.Event()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+
+    def note_activity(self):
+        """A real transcription ran, so the model is warm."""
+        self.last_activity = time.time()
+
+    def poke(self):
+        """Recording started: warm up now (while the user speaks) if we've been idle."""
+        if time.time() - self.last_activity > self.idle:
+            self.wake.set()
+
+    def in_hours(self):
+        if not self.hours: return True
+        start, end = self.hours
+        hour = time.localtime().tm_hour
+        return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+    def until_hours(self):
+        """Seconds until KEEPALIVE_HOURS next begin; 0 while inside them."""
+        if self.in_hours(): return 0.0
+        now = time.time()
+        t = time.localtime(now)
+        for day in (t.tm_mday, t.tm_mday + 1): # mktime normalizes the day overflow
+            start = time.mktime((t.tm_year, t.tm_mon, day, self.hours[0], 0, 0, 0, 0, -1))
+            if start > now: return start - now
+        return 0.0
+
+    def loop(self):
+        self.warm()
+        while self.running:
+            idle_for = time.time() - self.last_activity
+            if self.interval > 0:
+                # Out of hours there's nothing to do until they begin (pokes still wake us)
+                timeout = self.until_hours() or max(1.0, self.interval - idle_for)
+            else:
+                timeout = None
+            woke = self.wake.wait(timeout)
+            self.wake.clear()
+            if not self.running: break
+            if woke or (self.interval > 0 and time.time() - self.last_activity >= self.interval and self.in_hours()):
+                self.warm()
+
+    def warm(self):
+        t0 = time.perf_counter()
+        self.note_activity() # Also keeps pokes during the warm-up from queueing another one
+        try:
+            self.backend.warm_up()
+            TIMINGS.record("warmup", time.perf_counter() - t0)
+            self.logger.info(f"Transcription warm-up took {time.perf_counter() - t0:.1f}s")
+        except Exception as e:
+            self.logger.error(f"Warm-up error: {e}")
+        self.note_activity()
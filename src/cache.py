@@ -0,0 +1,39 @@
+import json
+import os
+import threading
+import time
+
+class DiskCache:
+    """Small JSON key/value store for data fetched from servers (e.g. ComfyUI node
+    info). Entries keep the value, the server fingerprint it was fetched under
+    and when it was stored. Writes are atomic; a corrupt file reads as empty."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def get(self, key):
+        """Returns {'value', 'fingerprint', 'stored'} or None."""
+        with self.lock:
+            return self._load().get(key)
+
+    def put(self, key, value, fingerprint=None):
+        with self.lock:
+            entries = self._load()
+            entries[key] = {'value': value, 'fingerprint': fingerprint, 'stored': time.time()}
+            tmp = f"{self.path}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(entries, f)
+                os.replace(tmp, self.path)
+            except OSError:
+                pass # Cache is best-effort
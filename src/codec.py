@@ -0,0 +1,152 @@
+import importlib.util
+import io
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .config import SAMPLE_RATE, FFMPEG, DECODE_TIMEOUT, DECODE_WORKERS, ARCHIVE_BOT_AUDIO, ARCHIVE_DIR
+from .backends import read_pcm16
+
+class DecodeError(Exception):
+    pass
+
+OPUS_RATE = 48000 # Ogg/Opus granule positions and pre-skip are always in 48 kHz samples
+OPUS_MAX_FRAME = 0.12 # Longest Opus packet, seconds
+
+_opuslib = None
+_opus_checked = False
+_pool = None
+_pool_lock = threading.Lock()
+
+def pool():
+    """Shared worker pool for decoding, so the chat clients' event loops never decode."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(DECODE_WORKERS, thread_name_prefix="decode")
+        return _pool
+
+def opus():
+    """The opuslib module, or None if it or the libopus library isn't installed."""
+    global _opuslib, _opus_checked
+    if not _opus_checked:
+        _opus_checked = True
+        if importlib.util.find_spec("opuslib") is not None:
+            try:
+                import opuslib # Raises if libopus itself can't be found
+                _opuslib = opuslib
+            except Exception:
+                pass
+    return _opuslib
+
+def decode_audio(data, mime=None):
+    """(int16 mono samples, sample rate) from encoded audio bytes, without touching disk.
+    16-bit WAV and Ogg/Opus (Telegram and Element voice notes) are decoded in-process;
+    anything else is piped through ffmpeg. Blocking: run it in pool()."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            return read_pcm16(io.BytesIO(data))
+        except (ValueError, EOFError, wave.Error):
+            pass # e.g. 8/24/32-bit or float WAV: let ffmpeg convert it
+    elif data[:4] == b"OggS" and opus() is not None:
+        samples = decode_ogg_opus(data)
+        if samples is not None:
+            return samples, SAMPLE_RATE
+    return ffmpeg_decode(data)
+
+def ogg_packets(data):
+    """Yields (serial, packet, granule) for each packet in an Ogg stream; granule is the
+    page's granule position for the last packet completed on a page, else -1."""
+    pos, partial = 0, {}
+    while pos + 27 <= len(data):
+        if data[pos:pos + 4] != b"OggS":
+            raise DecodeError(f"Bad Ogg page at byte {pos}")
+        granule, serial = struct.unpack_from("<qI", data, pos + 6)
+        nsegs = data[pos + 26]
+        lacing = data[pos + 27:pos + 27 + nsegs]
+        body = pos + 27 + nsegs
+        ends = [i for i, n in enumerate(lacing) if n < 255]
+        offset = body
+        packet = partial.pop(serial, b"")
+        for i, n in enumerate(lacing):
+            packet += data[offset:offset + n]
+            offset += n
+            if n < 255:
+                yield serial, packet, granule if i == ends[-1] else -1
+                packet = b""
+        if packet:
+            partial[serial] = packet # Continues on the next page of this stream
+        pos = body + sum(lacing)
+
+def decode_ogg_opus(data, sample_rate=SAMPLE_RATE):
+    """Decode the first Opus stream of an Ogg file with libopus, straight to int16 mono at
+    sample_rate (libopus resamples and downmixes internally). None if the file holds no
+    mono/stereo Opus stream, e.g. Ogg Vorbis, so the caller can fall back to ffmpeg."""
+    serial, decoder, pre_skip, gain, last_granule, chunks = None, None, 0, 0, -1, []
+    frame_size = int(sample_rate * OPUS_MAX_FRAME)
+    for page_serial, packet, granule in ogg_packets(data):
+        if serial is None:
+            if not packet.startswith(b"OpusHead") or len(packet) < 19:
+                continue
+            channels, pre_skip, _, gain, family = struct.unpack_from("<BHIhB", packet, 9)
+            if family != 0 or channels > 2:
+                return None # Multichannel mapping; leave it to ffmpeg
+            serial, decoder = page_serial, opus().Decoder(sample_rate, 1)
+            continue
+        if page_serial != serial or packet.startswith(b"OpusTags"):
+            continue
+        try:
+            chunks.append(decoder.decode(packet, frame_size))
+        except Exception as e:
+            raise DecodeError(f"Opus decode failed: {e}")
+        if granule >= 0:
+            last_granule = granule
+    if decoder is None:
+        return None
+    samples = np.frombuffer(b"".join(chunks), dtype=np.int16)
+    ratio = sample_rate / OPUS_RATE
+    start = int(pre_skip * ratio)
+    end = int(last_granule * ratio) if last_granule >= 0 else len(samples) # Trims end padding
+    samples = samples[start:max(start, end)]
+    if gain:
+        # Output gain in Q7.8 dB from the header
+        samples = np.clip(samples * 10 ** (gain / (20 * 256.0)), -32768, 32767).astype(np.int16)
+    return samples
+
+def ffmpeg_decode(data, sample_rate=SAMPLE_RATE):
+    """Decode any ffmpeg-supported format from memory to 16-bit mono PCM at sample_rate."""
+    exe = shutil.which(FFMPEG) or FFMPEG
+    try:
+        proc = subprocess.run(
+            [exe, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+            input=bytes(data), capture_output=True, timeout=DECODE_TIMEOUT,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0), # No console flash in the windowed exe
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise DecodeError(f"ffmpeg failed: {e}")
+    if proc.returncode != 0:
+        raise DecodeError(proc.stderr.decode(errors="replace").strip() or f"ffmpeg exited with {proc.returncode}")
+    return np.frombuffer(proc.stdout, dtype=np.int16), sample_rate
+
+def archive(data, prefix, ext):
+    """Keep a copy of received bot audio in ARCHIVE_DIR when ARCHIVE_BOT_AUDIO is set.
+    Returns the absolute path, or "" when archiving is off."""
+    if not ARCHIVE_BOT_AUDIO:
+        return ""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(ARCHIVE_DIR, f"{prefix}_{int(time.time() * 1000)}{ext}"))
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def decode_and_archive(data, mime, prefix, ext):
+    """decode_audio() and archive() as one blocking step for pool(). Returns
+    (samples, sample rate, archived path or "")."""
+    samples, rate = decode_audio(data, mime)
+    return samples, rate, archive(data, prefix, ext)
@@ -1,126 +1,552 @@
+import hashlib
 import json
 import os
-import sys
+import queue
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import urllib.parse
 import requests
 import websocket
-import wave
-import numpy as np
-from .config import COMFY_URL, WORKFLOW_FILE, INPUT_FILENAME
+from .config import (SAMPLE_RATE, COMFY_URLS, WORKFLOW_FILE, WORKFLOW_DIR, CACHE_FILE,
+                     COMFY_CONNECT_TIMEOUT, COMFY_POST_TIMEOUT, COMFY_RECV_TIMEOUT, COMFY_QUEUE_TIMEOUT,
+                     COMFY_EXEC_TIMEOUT, COMFY_HEALTH_INTERVAL, BREAKER_FAILURES, BREAKER_RESET)
+from .backends import TranscriptionBackend, write_pcm16, silence
+from .cache import DiskCache
+from .workflow import WorkflowRegistry
+from .metrics import TIMINGS, METRICS, wav_seconds
 
-class ComfyClient:
-    def __init__(self, logger, client_id):
+WHISPER_NODE = "Apply Whisper"
+DEFAULT_LANGUAGES = ["auto", "English", "German", "French", "Italian", "Spanish", "Japanese", "Chinese"]
+# Fields of /system_stats that identify a ComfyUI install (ram_free etc. change constantly)
+FINGERPRINT_FIELDS = ("os", "comfyui_version", "python_version", "pytorch_version", "embedded_python", "argv")
+# Messages for prompts nobody is waiting on yet (they can arrive before POST /prompt returns)
+ORPHAN_LIMIT = 256
+# Markers put on a job's message queue besides ComfyUI messages
+RECONNECTED = "reconnected"
+CANCELLED = "cancelled"
+
+class ComfyError(Exception):
+    """ComfyUI reported an error, or a stage missed its deadline."""
+
+class CircuitBreaker:
+    """Closed until `failures` consecutive failures, then open: calls fail fast
+    for `reset` seconds, after which one trial call is let through (half-open).
+    Its success closes the circuit again; its failure re-opens it."""
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.threshold = failures
+        self.reset = reset
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        """True while calls would be refused (open and not yet due for a trial)."""
+        with self.lock:
+            return self.opened_at is not None and (self.trial or time.monotonic() - self.opened_at < self.reset)
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None: return True
+            if self.trial or time.monotonic() - self.opened_at < self.reset: return False
+            self.trial = True # Half-open: this caller probes the server
+            return True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+def is_local_host(url):
+    host = url.rsplit(":", 1)[0].strip("[]")
+    if host in ("localhost", "127.0.0.1", "::1", socket.gethostname()): return True
+    try: return socket.gethostbyname(host).startswith("127.")
+    except OSError: return False
+
+class ComfyServer:
+    """One ComfyUI endpoint in the pool. Keeps a persistent websocket whose reader
+    thread hands each message to the job waiting on that prompt, tracks load from
+    /queue and the websocket's status broadcasts, and has its own circuit breaker."""
+    def __init__(self, url, client_id, logger):
+        self.url = url
+        self.client_id = client_id # All prompts we post here report to this websocket session
         self.logger = logger
-        self.client_id = client_id
-        self.workflow = self.load_workflow()
+        self.local = None # Local servers read our audio files directly; resolved on first use
+        self.breaker = CircuitBreaker()
+        self.healthy = False
+        self.queue_remaining = 0 # Prompts queued or running on the server (all clients)
+        self.inflight = 0 # Our prompts posted here and not finished
+        self.dispatched = 0 # Jobs sent here, to spread ties round-robin
+        self.lock = threading.Lock()
+        self.waiters = {} # prompt_id -> queue.Queue of messages
+        self.orphans = {} # prompt_id -> [messages] received before the waiter registered
+        self.ws = None
+        self.connected = threading.Event()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.reader_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        ws = self.ws
+        if ws:
+            try: ws.close()
+            except Exception: pass
 
-    def load_workflow(self):
+    def load(self):
+        # The server's count lags behind our own posts between polls
+        return max(self.queue_remaining, self.inflight)
+
+    def check_health(self):
         try:
-            # Handle PyInstaller path
-            if hasattr(sys, '_MEIPASS'):
-                wf_path = os.path.join(sys._MEIPASS, WORKFLOW_FILE)
-            else:
-                wf_path = WORKFLOW_FILE
-            
-            with open(wf_path, 'r', encoding='utf-8') as f:
-                wf = json.load(f)
-            self.logger.info(f"Loaded workflow from {wf_path}")
-            return wf
+            resp = requests.get(f"http://{self.url}/system_stats", timeout=COMFY_CONNECT_TIMEOUT)
+            resp.raise_for_status()
+            resp = requests.get(f"http://{self.url}/queue", timeout=COMFY_CONNECT_TIMEOUT)
+            data = resp.json()
+            self.queue_remaining = len(data.get("queue_running", [])) + len(data.get("queue_pending", []))
+            if not self.healthy: self.logger.info(f"ComfyUI {self.url} is up")
+            self.healthy = True
         except Exception as e:
-            self.logger.error(f"Failed to load workflow file: {e}")
-            return {}
+            if self.healthy: self.logger.warning(f"ComfyUI {self.url} health check failed: {e}")
+            self.healthy = False
+
+    # --- Websocket ---
+    def reader_loop(self):
+        delay = 0.5
+        while self.running:
+            try:
+                ws = websocket.WebSocket()
+                ws.connect(f"ws://{self.url}/ws?clientId={self.client_id}", timeout=COMFY_CONNECT_TIMEOUT)
+                ws.settimeout(COMFY_RECV_TIMEOUT)
+            except Exception:
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            delay = 0.5
+            self.ws = ws
+            self.connected.set()
+            # Anything sent while we were disconnected is only in /history now
+            self.broadcast(RECONNECTED)
+            try:
+                while self.running:
+                    try:
+                        out = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    if isinstance(out, str): self.dispatch(json.loads(out))
+            except Exception as e:
+                if self.running: self.logger.warning(f"ComfyUI {self.url} websocket dropped: {e}")
+            finally:
+                self.connected.clear()
+                self.ws = None
+                try: ws.close()
+                except Exception: pass
+
+    def dispatch(self, message):
+        data = message.get('data') or {}
+        if message.get('type') == 'status':
+            remaining = data.get('status', {}).get('exec_info', {}).get('queue_remaining')
+            if remaining is not None: self.queue_remaining = remaining
+            return
+        prompt_id = data.get('prompt_id')
+        if prompt_id is None: return
+        with self.lock:
+            waiter = self.waiters.get(prompt_id)
+            if waiter is None:
+                self.orphans.setdefault(prompt_id, []).append(message)
+                while len(self.orphans) > ORPHAN_LIMIT:
+                    self.orphans.pop(next(iter(self.orphans)))
+                return
+        waiter.put(message)
 
-    def get_languages(self):
-        """Try to fetch available languages from the Apply Whisper node dynamically."""
+    def broadcast(self, marker):
+        with self.lock:
+            waiters = list(self.waiters.values())
+        for waiter in waiters: waiter.put(marker)
+
+    def register(self, prompt_id):
+        waiter = queue.Queue()
+        with self.lock:
+            for message in self.orphans.pop(prompt_id, []): waiter.put(message)
+            self.waiters[prompt_id] = waiter
+        return waiter
+
+    def unregister(self, prompt_id):
+        with self.lock:
+            self.waiters.pop(prompt_id, None)
+            self.orphans.pop(prompt_id, None)
+
+    # --- HTTP ---
+    def stage_audio(self, path):
+        """The LoadAudio input for `path`: the path itself on a local server, otherwise
+        the name of a copy uploaded to the server's input folder."""
+        if self.local is None: self.local = is_local_host(self.url)
+        if self.local: return path
+        with open(path, 'rb') as f:
+            resp = requests.post(f"http://{self.url}/upload/image",
+                                 files={"image": (os.path.basename(path), f, "audio/wav")},
+                                 data={"type": "input", "overwrite": "true"},
+                                 timeout=(COMFY_CONNECT_TIMEOUT, COMFY_POST_TIMEOUT))
+        resp.raise_for_status()
+        info = resp.json()
+        return f"{info['subfolder']}/{info['name']}" if info.get('subfolder') else info['name']
+
+    def abort_prompt(self, prompt_id):
         try:
-            resp = requests.get(f"http://{COMFY_URL}/object_info", timeout=3)
-            if resp.status_code == 200:
-                data = resp.json()
-                if "Apply Whisper" in data:
-                    inputs = data["Apply Whisper"].get("input", {})
-                    # Usually required -> language -> [0] is type, [1] is config with choices
-                    lang_info = inputs.get("required", {}).get("language", [])
-                    if len(lang_info) > 1 and isinstance(lang_info[1], dict):
-                        choices = lang_info[1].get("choices")
-                        if choices: return choices
-        except: pass
+            resp = requests.get(f"http://{self.url}/queue", timeout=3)
+            running = [item[1] for item in resp.json().get("queue_running", [])]
+            if prompt_id in running:
+                requests.post(f"http://{self.url}/interrupt", json={"prompt_id": prompt_id}, timeout=3)
+                self.logger.info(f"Interrupted ComfyUI prompt {prompt_id}")
+            else:
+                requests.post(f"http://{self.url}/queue", json={"delete": [prompt_id]}, timeout=3)
+                self.logger.info(f"Removed ComfyUI prompt {prompt_id} from queue")
+        except Exception as e:
+            self.logger.error(f"Failed to cancel ComfyUI prompt {prompt_id}: {e}")
+
+class ComfyClient(TranscriptionBackend):
+    """Transcription through a pool of ComfyUI servers (COMFY_URLS). Each job goes to
+    the least-loaded healthy server whose circuit is closed."""
+    name = "comfy"
+
+    def __init__(self, logger, client_id, urls=None):
+        self.logger = logger
+        self.client_id = client_id
+        self.servers = [ComfyServer(url, f"{client_id}-{i}", logger) for i, url in enumerate(urls or COMFY_URLS)]
+        # Compiled templates per workflow file, reloaded when the files change
+        self.workflows = WorkflowRegistry(logger, WORKFLOW_FILE, WORKFLOW_DIR)
+        self.workflows.start()
+        # In-flight jobs: job_id -> {'server', 'prompt_id': str/None, 'waiter': Queue/None, 'cancelled': bool}
+        self.active = {}
+        self.active_lock = threading.Lock()
+        self.cache = DiskCache(CACHE_FILE)
+        self.running = True
+        self.checked = threading.Event() # Set after the first round of health checks
+        for server in self.servers: server.start()
+        threading.Thread(target=self.health_loop, daemon=True).start()
+        METRICS.gauge("voiceinputter_comfy_circuit_open",
+                      lambda: [({"server": s.url}, int(s.breaker.is_open())) for s in self.servers],
+                      "1 while jobs for a ComfyUI server are failed fast after repeated errors")
+        METRICS.gauge("voiceinputter_comfy_server_load",
+                      lambda: [({"server": s.url}, s.load()) for s in self.servers],
+                      "Prompts queued or running per ComfyUI server")
+        METRICS.gauge("voiceinputter_comfy_inflight_prompts", lambda: len(self.active),
+                      "Jobs with a ComfyUI prompt in flight")
+
+    def stop(self):
+        self.running = False
+        self.workflows.stop()
+        for server in self.servers: server.stop()
+
+    # --- Pool ---
+    def health_loop(self):
+        while self.running:
+            threads = [threading.Thread(target=s.check_health, daemon=True) for s in self.servers]
+            for t in threads: t.start()
+            for t in threads: t.join()
+            self.checked.set()
+            time.sleep(COMFY_HEALTH_INTERVAL)
+
+    def pick(self):
+        """Least-loaded server that can take a job now, or None if every circuit is open.
+        Servers that passed their last health check and have a websocket come first."""
+        candidates = [s for s in self.servers if not s.breaker.is_open()]
+        if not candidates: return None
+        ready = [s for s in candidates if s.healthy and s.connected.is_set()]
+        server = min(ready or candidates, key=lambda s: (s.load(), s.dispatched))
+        server.dispatched += 1
+        return server
+
+    def primary(self, wait=0):
+        """Server used for metadata (language list): first healthy one, else the first.
+        Waits up to `wait` seconds for the first health checks to finish."""
+        if wait: self.checked.wait(wait)
+        return next((s for s in self.servers if s.healthy), self.servers[0])
+
+    def available(self):
+        return any(not s.breaker.is_open() for s in self.servers)
+
+    # --- Languages ---
+    def get_languages(self, on_refresh=None):
+        """Language choices of the Apply Whisper node, from the primary server. A cached list is
+        returned at once and revalidated in the background; on_refresh(languages) is
+        called if it changed. Without a cache entry the server is queried directly."""
+        # Health checks may still be running at startup: any cached server's list will do
+        # for now (healthy ones first), and the revalidation asks a server that is up
+        for server in sorted(self.servers, key=lambda s: not s.healthy):
+            key = f"languages|{server.url}"
+            entry = self.cache.get(key)
+            if entry and entry.get('value'):
+                METRICS.inc("voiceinputter_cache_requests_total", cache="object_info", result="hit")
+                threading.Thread(target=self.revalidate_languages, args=(None, key, entry, on_refresh), daemon=True).start()
+                return entry['value']
+
+        METRICS.inc("voiceinputter_cache_requests_total", cache="object_info", result="miss")
+        url = self.primary(wait=COMFY_CONNECT_TIMEOUT).url
+        key = f"languages|{url}"
+        fingerprint = self.server_fingerprint(url)
+        languages = self.fetch_languages(url)
+        if languages:
+            self.cache.put(key, languages, fingerprint)
+            return languages
         # Fallback
-        return ["auto", "English", "German", "French", "Italian", "Spanish", "Japanese", "Chinese"]
-
-    def save_audio(self, audio_data, sample_rate):
-        if not audio_data: return False
-        audio_array = np.concatenate(audio_data, axis=0)
-        audio_int16 = (audio_array * 32767).astype(np.int16)
-        with wave.open(INPUT_FILENAME, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(sample_rate)
-            wf.writeframes(audio_int16.tobytes())
-        return True
+        return DEFAULT_LANGUAGES
+
+    def revalidate_languages(self, url, key, entry, on_refresh):
+        """Refresh a cached entry from url, or from the primary server if None (which
+        then updates that server's entry)."""
+        if url is None:
+            url = self.primary(wait=COMFY_CONNECT_TIMEOUT).url
+            if key != f"languages|{url}":
+                # The list shown came from another server's entry: fetch this one's
+                key, entry = f"languages|{url}", {'value': entry['value'], 'fingerprint': None}
+        fingerprint = self.server_fingerprint(url)
+        if fingerprint is None: return # Server down; keep serving the cached list
+        if fingerprint == entry.get('fingerprint'): return
+        METRICS.inc("voiceinputter_cache_requests_total", cache="object_info", result="stale")
+        languages = self.fetch_languages(url)
+        if not languages: return
+        self.cache.put(key, languages, fingerprint)
+        if languages != entry['value']:
+            self.logger.info("ComfyUI language list changed, refreshing")
+            if on_refresh: on_refresh(languages)
+
+    def server_fingerprint(self, url):
+        """Hash of the server's identity from /system_stats, or None if unreachable."""
+        try:
+            resp = requests.get(f"http://{url}/system_stats", timeout=3)
+            if resp.status_code != 200: return None
+            data = resp.json()
+            system = data.get("system", {})
+            ident = {k: system.get(k) for k in FINGERPRINT_FIELDS}
+            ident["devices"] = [d.get("name") for d in data.get("devices", [])]
+            return hashlib.sha1(json.dumps(ident, sort_keys=True).encode()).hexdigest()
+        except Exception:
+            return None
+
+    def fetch_languages(self, url):
+        """Query only the Apply Whisper node's info; servers without per-node
+        /object_info/<class> get the full table. Returns None on failure."""
+        urls = [f"http://{url}/object_info/{urllib.parse.quote(WHISPER_NODE)}",
+                f"http://{url}/object_info"]
+        for url in urls:
+            try:
+                resp = requests.get(url, timeout=3)
+                if resp.status_code != 200: continue
+                node = resp.json().get(WHISPER_NODE)
+                if node is None: continue
+                return self.parse_language_choices(node)
+            except Exception:
+                continue
+        return None
 
-    def find_node(self, key, value):
-        for node_id, node in self.workflow.items():
-            if key == "class_type" and node.get("class_type") == value: return node_id
-            if key == "title" and node.get("_meta", {}).get("title") == value: return node_id
+    @staticmethod
+    def parse_language_choices(node):
+        # Usually required -> language -> [0] is type (or the choice list), [1] is config with choices
+        lang_info = node.get("input", {}).get("required", {}).get("language", [])
+        if lang_info and isinstance(lang_info[0], list):
+            return lang_info[0] or None
+        if len(lang_info) > 1 and isinstance(lang_info[1], dict):
+            return lang_info[1].get("choices") or lang_info[1].get("options") or None
         return None
 
-    def process(self, audio_data, sample_rate, language="auto"):
-        if audio_data is not None:
-            if not self.save_audio(audio_data, sample_rate):
-                return None
-        
-        abs_path = os.path.abspath(INPUT_FILENAME)
-        load_node_id = self.find_node("class_type", "LoadAudio")
-        if load_node_id:
-            self.workflow[load_node_id]["inputs"]["audio"] = abs_path
-
-        whisper_node_id = self.find_node("class_type", "Apply Whisper")
-        if whisper_node_id:
-            self.workflow[whisper_node_id]["inputs"]["language"] = language
-            
-        preview_text_node_id = self.find_node("title", "Preview Text")
-        if not whisper_node_id: whisper_node_id = "98"
-
-        ws = None
+    # --- Jobs ---
+    def cancel(self, job_id):
+        """Stop an in-flight job: its prompt is removed from the ComfyUI queue, or
+        interrupted if already running. Returns False if the job isn't in flight."""
+        with self.active_lock:
+            entry = self.active.get(job_id)
+            if entry is None: return False
+            entry['cancelled'] = True
+            prompt_id = entry['prompt_id']
+            waiter = entry['waiter']
+        # Unblocks the wait in process()
+        if waiter: waiter.put(CANCELLED)
+        if prompt_id:
+            # Don't block the caller (usually the UI thread) on ComfyUI
+            threading.Thread(target=entry['server'].abort_prompt, args=(prompt_id,), daemon=True).start()
+        return True
+
+    def transcribe(self, audio_path=None, audio=None, sample_rate=SAMPLE_RATE, language="auto",
+                   job_id=None, source=None):
+        if audio_path is not None:
+            return self.process(audio_path, language, job_id=job_id, source=source)
+        # ComfyUI's LoadAudio reads from disk, so a buffer needs a per-job file
+        fd, path = tempfile.mkstemp(prefix="vi_comfy_", suffix=".wav")
+        os.close(fd)
+        try:
+            write_pcm16(path, audio, sample_rate)
+            return self.process(path, language, job_id=job_id, source=source)
+        finally:
+            try: os.remove(path)
+            except OSError: pass
+
+    def warm_up(self):
+        """Post a silent clip through each distinct workflow on every server so all the
+        models they use are loaded."""
+        fd, path = tempfile.mkstemp(prefix="vi_warmup_", suffix=".wav")
+        os.close(fd)
+        try:
+            write_pcm16(path, silence())
+            for server in self.servers:
+                for template in self.workflows.distinct():
+                    self.process(path, job_id=f"warmup-{server.url}-{template.name}",
+                                 template=template, server=server)
+        finally:
+            try: os.remove(path)
+            except OSError: pass
+
+    def process(self, audio_path, language="auto", job_id=None, source=None, template=None, server=None):
+        """Transcribe the WAV at audio_path (each job brings its own file, see transcribe()).
+        The workflow is picked by the registry rules from the clip length, language and
+        source (job origin), the server by load unless given. Safe to call from several
+        workers at once (templates are read-only); pass job_id to make it cancellable.
+        Returns the text, "" if cancelled, None on failure."""
+        abs_path = os.path.abspath(audio_path)
+        template = template or self.workflows.select(wav_seconds(abs_path), language, source)
+        job_id = job_id or uuid.uuid4().hex[:12]
+        server = server or self.pick()
+        if server is None or not server.breaker.allow():
+            self.logger.warning(f"No ComfyUI server available (circuits open), failing job {job_id} fast")
+            return None
+
         final_text = ""
+        prompt_id = None
+        entry = {'server': server, 'prompt_id': None, 'waiter': None, 'cancelled': False}
+        with self.active_lock:
+            self.active[job_id] = entry
+        with server.lock:
+            server.inflight += 1
         try:
-            ws = websocket.WebSocket()
-            ws.connect(f"ws://{COMFY_URL}/ws?clientId={self.client_id}")
-            
-            prompt_payload = {"prompt": self.workflow, "client_id": self.client_id}
-            resp = requests.post(f"http://{COMFY_URL}/prompt", json=prompt_payload)
+            # Each server keeps one websocket session; prompts report to it by client_id
+            body = template.render(server.stage_audio(abs_path), language, server.client_id)
+            with TIMINGS.span("prompt_post", job_id):
+                resp = requests.post(f"http://{server.url}/prompt", data=body,
+                                     headers={"Content-Type": "application/json"},
+                                     timeout=(COMFY_CONNECT_TIMEOUT, COMFY_POST_TIMEOUT))
+            if resp.status_code != 200:
+                # Validation errors (missing model/node) come back as 400 with details
+                raise ComfyError(f"/prompt returned {resp.status_code}: {resp.text[:200]}")
             prompt_id = resp.json().get("prompt_id")
-            
-            while True:
-                out = ws.recv()
-                if isinstance(out, str):
-                    message = json.loads(out)
-                    if message['type'] == 'executed':
-                        data = message['data']
-                        if data['prompt_id'] == prompt_id:
-                            node_id = data.get('node')
-                            is_target = False
-                            if preview_text_node_id and node_id == preview_text_node_id: is_target = True
-                            elif not preview_text_node_id and node_id == whisper_node_id: is_target = True
-                            
-                            if is_target:
-                                output = data.get('output', {})
-                                if isinstance(output, dict):
-                                    if 'string' in output: final_text = output['string']
-                                    elif 'text' in output: final_text = output['text']
-                                    elif 'ui' in output and 'text' in output['ui']: final_text = output['ui']['text'][0]
-                                    else:
-                                        for v in output.values():
-                                            if isinstance(v, list) and len(v)>0 and isinstance(v[0], str) and not v[0].endswith('.wav'):
-                                                final_text = v[0]
-                                                break
-                                if isinstance(final_text, list): final_text = final_text[0]
-                                if final_text: break
-
-                    if message['type'] == 'executing' and message['data']['node'] is None:
-                        if message['data']['prompt_id'] == prompt_id: break
+            waiter = server.register(prompt_id)
+            with self.active_lock:
+                entry['prompt_id'] = prompt_id
+                entry['waiter'] = waiter
+                cancelled = entry['cancelled']
+            if cancelled:
+                # Cancelled while the prompt was being posted
+                server.abort_prompt(prompt_id)
+                return ""
+
+            final_text = self.wait_for_result(server, waiter, prompt_id, template, job_id)
+            server.breaker.success()
         except Exception as e:
-            self.logger.error(f"ComfyUI Process Error: {e}")
+            with self.active_lock:
+                cancelled = entry['cancelled']
+            if cancelled:
+                self.logger.info(f"ComfyUI job {job_id} cancelled")
+            else:
+                self.logger.error(f"ComfyUI Process Error ({server.url}): {e}")
+                server.breaker.failure()
+                final_text = None
         finally:
-            if ws: ws.close()
-            
+            with self.active_lock:
+                if self.active.get(job_id) is entry:
+                    del self.active[job_id]
+            with server.lock:
+                server.inflight -= 1
+            if prompt_id: server.unregister(prompt_id)
+            if entry['cancelled']: final_text = ""
+
+        return final_text
+
+    def wait_for_result(self, server, waiter, prompt_id, template, job_id):
+        """Follow the prompt's websocket messages until it finishes. The queue and
+        execution stages each have a deadline; after a quiet spell or a reconnect the
+        prompt is checked against /history in case its messages were missed."""
+        posted_at = time.perf_counter()
+        started_at = None
+        final_text = ""
+        while True:
+            now = time.perf_counter()
+            if started_at is None and now - posted_at > COMFY_QUEUE_TIMEOUT:
+                server.abort_prompt(prompt_id)
+                raise ComfyError(f"prompt {prompt_id} still queued after {COMFY_QUEUE_TIMEOUT}s")
+            if started_at is not None and now - started_at > COMFY_EXEC_TIMEOUT:
+                server.abort_prompt(prompt_id)
+                raise ComfyError(f"prompt {prompt_id} still running after {COMFY_EXEC_TIMEOUT}s")
+
+            try:
+                message = waiter.get(timeout=COMFY_RECV_TIMEOUT)
+            except queue.Empty:
+                message = None
+            if message == CANCELLED:
+                raise ComfyError("cancelled")
+            if message is None or message == RECONNECTED:
+                # Quiet (queued behind others, or a missed result) or the socket was re-established
+                text = self.history_text(server, prompt_id, template)
+                if text is not None: return text
+                continue
+
+            mtype = message.get('type')
+            data = message.get('data', {})
+            if started_at is None and mtype in ('execution_start', 'executing'):
+                # Time spent waiting in ComfyUI's queue behind other prompts
+                started_at = time.perf_counter()
+                TIMINGS.record("comfy_queue_wait", started_at - posted_at, job_id)
+
+            if mtype == 'executed' and data.get('node') == template.output_node_id:
+                final_text = self.extract_text(data.get('output', {}))
+                if final_text: break
+            elif mtype == 'executing' and data.get('node') is None:
+                break
+            elif mtype == 'execution_interrupted':
+                break
+            elif mtype == 'execution_error':
+                raise ComfyError(f"node {data.get('node_id')} ({data.get('node_type', '?')}) failed: "
+                                 f"{data.get('exception_message', '').strip()}")
+
+        if started_at is not None:
+            TIMINGS.record("comfy_execution", time.perf_counter() - started_at, job_id)
+        return final_text
+
+    def history_text(self, server, prompt_id, template):
+        """Text of a finished prompt from /history, None if it hasn't finished."""
+        try:
+            resp = requests.get(f"http://{server.url}/history/{prompt_id}", timeout=COMFY_CONNECT_TIMEOUT)
+            entry = resp.json().get(prompt_id) if resp.status_code == 200 else None
+        except Exception:
+            return None
+        if not entry: return None
+        if entry.get('status', {}).get('status_str') == 'error':
+            raise ComfyError(f"prompt {prompt_id} failed (see ComfyUI log)")
+        return self.extract_text(entry.get('outputs', {}).get(template.output_node_id, {}))
+
+    @staticmethod
+    def extract_text(output):
+        final_text = ""
+        if isinstance(output, dict):
+            if 'string' in output: final_text = output['string']
+            elif 'text' in output: final_text = output['text']
+            elif 'ui' in output and 'text' in output['ui']: final_text = output['ui']['text'][0]
+            else:
+                for v in output.values():
+                    if isinstance(v, list) and len(v)>0 and isinstance(v[0], str) and not v[0].endswith('.wav'):
+                        final_text = v[0]
+                        break
+        if isinstance(final_text, list): final_text = final_text[0] if final_text else ""
         return final_text
@@ -1,10 +1,72 @@
-from pynput import keyboard
-
 # Configuration
-COMFY_URL = "localhost:8188"
+# ComfyUI servers ("host:port"); each job goes to the least-loaded healthy one
+COMFY_URLS = ["localhost:8188"]
+COMFY_HEALTH_INTERVAL = 5  # Seconds between /system_stats + /queue checks
+# ComfyUI deadlines (seconds) and failure handling
+COMFY_CONNECT_TIMEOUT = 5  # Websocket/HTTP connect
+COMFY_POST_TIMEOUT = 10    # POST /prompt response
+COMFY_RECV_TIMEOUT = 10    # Silence on a job before checking /history
+COMFY_QUEUE_TIMEOUT = 180  # Waiting behind other prompts
+COMFY_EXEC_TIMEOUT = 120   # Running our prompt
+BREAKER_FAILURES = 3       # Consecutive failures before jobs fail fast / go to a LAN peer
+BREAKER_RESET = 30         # Seconds before a trial job is let through again
 WORKFLOW_FILE = "stt.json"
-INPUT_FILENAME = "input_audio.wav"
+WORKFLOW_DIR = "workflows" # Extra workflows + rules.json, hot-reloaded (see src/workflow.py)
+CACHE_FILE = "comfy_cache.json" # Server info (e.g. language choices) reused across starts
+# Bot audio (Matrix/Telegram) is downloaded and decoded in memory; set ARCHIVE_BOT_AUDIO
+# to also keep the received files in ARCHIVE_DIR
+ARCHIVE_BOT_AUDIO = False
+ARCHIVE_DIR = "downloads"
+FFMPEG = "ffmpeg"      # Fallback for formats that can't be decoded in-process (WAV, Ogg/Opus with opuslib)
+DECODE_TIMEOUT = 60
+DECODE_WORKERS = 2
+# Per chat client: audio messages downloaded/decoded at once (different chats in parallel,
+# each chat delivered in order); further ones wait, pausing intake (backpressure)
+# instead of queuing without bound.
+BOT_AUDIO_IN_FLIGHT = 4
+# Matrix accounts (user client + bot client) share one event loop and connection pool
+MATRIX_POOL_SIZE = 8
+MATRIX_SYNC_TIMEOUT = 30000 # Long-poll, ms
+# Telegram updates by "polling" or "webhook" (pushed to our own HTTP(S) endpoint). In
+# webhook mode the bot registers TELEGRAM_WEBHOOK_URL (public https URL ending in
+# TELEGRAM_WEBHOOK_PATH, e.g. via a tunnel/proxy or a self-signed cert on 443/80/88/8443);
+# leave it empty to only serve locally, e.g. for replaying recorded updates.
+TELEGRAM_MODE = "polling"
+TELEGRAM_WEBHOOK_URL = ""
+TELEGRAM_WEBHOOK_PATH = "/telegram"
+TELEGRAM_WEBHOOK_PORT = 8443
+TELEGRAM_WEBHOOK_CERT = ""   # PEM certificate (and key) to serve HTTPS directly; empty = plain HTTP
+TELEGRAM_WEBHOOK_KEY = ""
+TELEGRAM_WEBHOOK_SECRET = "" # Checked against X-Telegram-Bot-Api-Secret-Token; empty = random per connect
+TELEGRAM_WEBHOOK_WORKERS = 4 # HTTP worker threads, also Telegram's max_connections
 SAMPLE_RATE = 16000
 VAD_THRESHOLD = 0.01
 VAD_SILENCE_DURATION = 2.0
-HOTKEY = {keyboard.Key.f9}
+# Input device (name as listed in the mic selector) to switch to when the selected mic
+# disappears; empty = the system default input
+AUDIO_FALLBACK_DEVICE = ""
+PROCESSING_WORKERS = 4
+# Transcription engine: "comfy", "local" (in-process faster-whisper on CPU) or
+# "auto" (clips up to LOCAL_MAX_SECONDS locally, longer ones to ComfyUI)
+TRANSCRIPTION_BACKEND = "auto"
+LOCAL_MAX_SECONDS = 8.0
+LOCAL_MODEL = "small"
+LOCAL_COMPUTE_TYPE = "int8"
+LOCAL_THREADS = 4
+# Warm-up: a silent clip keeps the Whisper model(s) loaded. Runs at startup, when recording
+# starts after WARMUP_IDLE_SECONDS without transcriptions, and every KEEPALIVE_INTERVAL
+# seconds of inactivity during KEEPALIVE_HOURS (local start/end hour; None = any time).
+WARMUP_CLIP_SECONDS = 0.5
+WARMUP_IDLE_SECONDS = 300
+KEEPALIVE_INTERVAL = 600 # 0 disables the timer
+KEEPALIVE_HOURS = (7, 23)
+# Max concurrent jobs per class (see src/scheduler.py); interactive is unlimited
+PROCESSING_LIMITS = {"bot": 2, "bulk": 1}
+# Bot chats/rooms are transcribed in parallel but in order within each chat. Per chat:
+# at most BOT_CHAT_QUEUE voice notes waiting (more are refused with a reply) and
+# BOT_CHAT_RATE = (count, seconds) started per period.
+BOT_CHAT_QUEUE = 5
+BOT_CHAT_RATE = (6, 60)
+# pynput keys; filled from DEFAULT_HOTKEY when the keyboard listener starts (pynput loads lazily)
+HOTKEY = set()
+DEFAULT_HOTKEY = ["F9"]
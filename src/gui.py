@@ -131,6 +131,7 @@ class Overlay(QMainWindow):
         # Variables
         self.vad_auto_stop_var = BooleanVar(True)
         self.vad_trigger_var = BooleanVar(False)
+        self.vad_speculative_var = BooleanVar(False)
         self.auto_process_var = BooleanVar(True)
         self.auto_send_var = BooleanVar(True)
         self.auto_enter_var = BooleanVar(False)
@@ -303,8 +304,27 @@ class Overlay(QMainWindow):
         btn_refresh_mic.setFixedWidth(24)
         btn_refresh_mic.clicked.connect(self.manual_scan_mics)
         mic_layout.addWidget(btn_refresh_mic)
+        btn_add_mic = QPushButton("+")
+        btn_add_mic.setFixedWidth(24)
+        btn_add_mic.setToolTip("Also record from this mic (voice-triggered)")
+        btn_add_mic.clicked.connect(self.add_mic_source)
+        mic_layout.addWidget(btn_add_mic)
         gen_layout.addLayout(mic_layout)
         
+        # Extra capture sources
+        self.mic_sources_frame = QWidget()
+        src_layout = QHBoxLayout(self.mic_sources_frame)
+        src_layout.setContentsMargins(0, 0, 0, 0)
+        self.lbl_mic_sources = QLabel("")
+        self.lbl_mic_sources.setWordWrap(True)
+        src_layout.addWidget(self.lbl_mic_sources, 1)
+        btn_clear_src = QPushButton("✕")
+        btn_clear_src.setFixedWidth(24)
+        btn_clear_src.clicked.connect(lambda: self.queue.put("clear_mic_sources"))
+        src_layout.addWidget(btn_clear_src)
+        gen_layout.addWidget(self.mic_sources_frame)
+        self.mic_sources_frame.setVisible(False)
+        
         # VAD Auto-Stop Row (Side by Side)
         vad_stop_layout = QHBoxLayout()
         chk_stop = QCheckBox("Auto-Stop")
@@ -319,6 +339,10 @@ class Overlay(QMainWindow):
         vad_stop_layout.addWidget(txt_sil)
         gen_layout.addLayout(vad_stop_layout)
         
+        chk_spec = QCheckBox("Speculative (transcribe at silence onset)")
+        self.vad_speculative_var.attach(chk_spec, self.update_settings)
+        gen_layout.addWidget(chk_spec)
+        
         # VAD Trigger Row (Side by Side)
         vad_trig_layout = QHBoxLayout()
         chk_trig = QCheckBox("Record on Voice")
@@ -518,6 +542,19 @@ class Overlay(QMainWindow):
         
         conn_layout.addStretch()
 
+        # Stats Tab (per-stage latency diagnostics)
+        tab_stats = QWidget()
+        self.tabs.addTab(tab_stats, "Stats")
+        stats_layout = QVBoxLayout(tab_stats)
+        self.txt_stats = QTextEdit()
+        self.txt_stats.setReadOnly(True)
+        self.txt_stats.setFont(QFont("Consolas", 8))
+        stats_layout.addWidget(self.txt_stats)
+        btn_stats = QPushButton("Refresh")
+        btn_stats.clicked.connect(self.manual_refresh_stats)
+        stats_layout.addWidget(btn_stats)
+        self.tabs.currentChanged.connect(lambda i: self.manual_refresh_stats() if self.tabs.widget(i) is tab_stats else None)
+
     # --- Interaction Logic ---
     # Standard OS window handles move/resize
 
@@ -570,9 +607,10 @@ class Overlay(QMainWindow):
         if t: self.queue.put(("send_text", t))
     def manual_process(self): self.queue.put("manual_process")
     def manual_scan(self): self.queue.put("scan_network")
-    def manual_scan_mics(self): self.queue.put("scan_mics")
+    def manual_scan_mics(self): self.queue.put("rescan_mics")
     def manual_scan_windows(self): self.queue.put("scan_windows")
     def manual_focus_target(self): self.queue.put("focus_target")
+    def manual_refresh_stats(self): self.queue.put("refresh_stats")
     def quit_app(self): self.queue.put("quit")
     
     def connect_matrix(self):
@@ -608,6 +646,9 @@ class Overlay(QMainWindow):
     def append_text(self, text):
         self.txt_output.append(text)
 
+    def update_stats(self, text):
+        self.txt_stats.setPlainText(text)
+
     def update_peers(self, peers):
         self.cmb_peers.clear()
         self.cmb_peers.addItems(peers)
@@ -628,6 +669,14 @@ class Overlay(QMainWindow):
             self.cmb_mic.setCurrentIndex(current_index)
         self.cmb_mic.blockSignals(False)
 
+    def update_mic_sources(self, names):
+        self.lbl_mic_sources.setText("Also recording: " + ", ".join(names))
+        self.mic_sources_frame.setVisible(bool(names))
+
+    def add_mic_source(self):
+        idx = self.cmb_mic.currentIndex()
+        if idx >= 0: self.queue.put(("add_mic_source", idx))
+
     def update_window_list(self, windows):
         current = self.cmb_target.currentText()
         self.cmb_target.clear()
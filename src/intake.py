@@ -0,0 +1,42 @@
+import asyncio
+from .config import BOT_AUDIO_IN_FLIGHT
+
+class AudioIntake:
+    """Bot audio intake on a chat client's event loop. Downloads and decodes of
+    different messages run concurrently, but each chat's results are delivered in
+    the order the messages arrived, so a short voice note can't overtake a long
+    one. At most `limit` receives run at once; further submit() calls wait, which
+    pauses the client's update handling (backpressure)."""
+    def __init__(self, loop, logger, limit=BOT_AUDIO_IN_FLIGHT):
+        self.loop = loop
+        self.logger = logger
+        self.slots = asyncio.Semaphore(limit)
+        self.tails = {} # chat_id -> future set once that chat's last message is delivered
+
+    async def submit(self, chat_id, receive, deliver):
+        """receive() is a coroutine function returning a result (None to drop the message);
+        deliver(result) is called in arrival order per chat. Must be awaited by the update
+        handler before any other await, as that is where the arrival order is taken."""
+        prev = self.tails.get(chat_id)
+        done = self.loop.create_future()
+        self.tails[chat_id] = done
+        await self.slots.acquire()
+        self.loop.create_task(self._run(chat_id, receive, deliver, prev, done))
+
+    async def _run(self, chat_id, receive, deliver, prev, done):
+        try:
+            try:
+                result = await receive()
+            except Exception as e:
+                self.logger.error(f"Failed to receive audio from {chat_id}: {e}")
+                result = None
+            finally:
+                self.slots.release()
+            if prev is not None:
+                await prev # Earlier message of this chat delivered (or dropped)
+            if result is not None:
+                deliver(result)
+        finally:
+            done.set_result(None)
+            if self.tails.get(chat_id) is done:
+                del self.tails[chat_id]
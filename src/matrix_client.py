@@ -1,68 +1,139 @@
 import asyncio
 import threading
 import logging
+import mimetypes
 import os
-import time
+import aiohttp
 from nio import AsyncClient, UploadResponse, DownloadResponse
 from nio.events.room_events import RoomMessageText, RoomMessageAudio
+from .tasks import BotJob
+from .codec import decode_and_archive, pool as codec_pool
+from .intake import AudioIntake
+from .config import MATRIX_POOL_SIZE, MATRIX_SYNC_TIMEOUT
 
-class MatrixManager:
-    def __init__(self, logger, name="Matrix"):
+# Only what the bot reacts to: room messages, with members loaded lazily and no
+# presence, receipts, typing or account data
+SYNC_FILTER = {
+    "presence": {"types": []},
+    "account_data": {"types": []},
+    "room": {
+        "state": {"lazy_load_members": True},
+        "timeline": {"types": ["m.room.message"], "limit": 20},
+        "ephemeral": {"types": []},
+        "account_data": {"types": []},
+    },
+}
+# First sync of a new session: just the token to continue from, not the history
+FIRST_SYNC_FILTER = dict(SYNC_FILTER, room=dict(SYNC_FILTER["room"], timeline={"types": ["m.room.message"], "limit": 1}))
+
+class MatrixRuntime:
+    """One thread and event loop, with one HTTP connection pool, for all Matrix accounts
+    (the user client and the bot client share it)."""
+    def __init__(self, logger):
         self.logger = logger
-        self.name = name
-        self.client = None
-        self.callbacks = []
-        self.sync_task = None
+        self.session = None # aiohttp session, created on the loop
+        self.managers = []
         self.loop = asyncio.new_event_loop()
         self.thread = threading.Thread(target=self.start_loop, daemon=True)
         self.thread.start()
-        self.connected = False
 
     def start_loop(self):
         asyncio.set_event_loop(self.loop)
         self.loop.run_forever()
-    
+
+    def get_session(self):
+        """The shared aiohttp session (on the loop thread only)."""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=MATRIX_POOL_SIZE))
+        return self.session
+
+    def stop(self):
+        async def close():
+            for manager in self.managers:
+                await manager._disconnect()
+            if self.session:
+                await self.session.close()
+        try:
+            asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout=5)
+        except Exception as e:
+            self.logger.error(f"Matrix shutdown error: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+class MatrixManager:
+    """One Matrix account on a MatrixRuntime (its own one if none is given)."""
+    def __init__(self, logger, name="Matrix", runtime=None):
+        self.logger = logger
+        self.name = name
+        self.own_runtime = runtime is None
+        self.runtime = runtime or MatrixRuntime(logger)
+        self.runtime.managers.append(self)
+        self.loop = self.runtime.loop
+        self.client = None
+        self.callbacks = []
+        self.sync_task = None
+        self.intake = AudioIntake(self.loop, logger)
+        self.connected = False
+
     def register_callback(self, callback):
-        """Callback signature: (type: str, content: str, room_id: str)"""
+        """Callback signature: (type: str, content: str | BotJob, room_id: str). Audio arrives as a BotJob."""
         self.callbacks.append(callback)
 
     def connect(self, homeserver, user_id, token):
         future = asyncio.run_coroutine_threadsafe(self._connect(homeserver, user_id, token), self.loop)
         return future # Could wait for result if needed
 
+    async def _disconnect(self):
+        """Stop syncing and drop the client; the runtime's connection pool stays open."""
+        if self.sync_task:
+            self.sync_task.cancel()
+            self.sync_task = None
+        if self.client:
+            self.client.client_session = None # Shared; close() would close it for every account
+            await self.client.close()
+        self.connected = False
+
     async def _connect(self, homeserver, user_id, token):
         try:
-            if self.client:
-                await self.client.close()
-            
-            if self.sync_task:
-                self.sync_task.cancel()
-                self.sync_task = None
+            # Reconnecting the same account continues from where its sync stopped
+            since = None
+            if self.client and (self.client.homeserver, self.client.user_id) == (homeserver, user_id):
+                since = self.client.next_batch
+            await self._disconnect()
             
             self.client = AsyncClient(homeserver, user_id)
+            self.client.client_session = self.runtime.get_session()
             self.client.access_token = token
             self.client.user_id = user_id # Explicitly set
             
             # Simple check
-            resp = await self.client.sync(timeout=1000, full_state=True)
-            if hasattr(resp, 'next_batch'):
+            resp = await self.client.whoami()
+            if getattr(resp, 'user_id', None):
                 self.logger.info(f"[{self.name}] Matrix connected as {user_id}")
                 self.connected = True
                 
-                # Start Sync Loop
-                self.sync_task = self.loop.create_task(self._sync_forever())
+                # Only accounts that receive messages sync; a send-only client needs no sync loop
+                if self.callbacks:
+                    self.sync_task = self.loop.create_task(self._sync_forever(since))
             else:
-                self.logger.error(f"[{self.name}] Matrix sync failed: {resp}")
+                self.logger.error(f"[{self.name}] Matrix login check failed: {resp}")
                 self.connected = False
         except Exception as e:
             self.logger.error(f"[{self.name}] Matrix connection error: {e}")
             self.connected = False
 
-    async def _sync_forever(self):
+    async def _sync_forever(self, since=None):
         try:
+            if since:
+                self.client.next_batch = since # Messages sent while disconnected are delivered
+            else:
+                # Skip the rooms' history: callbacks are only added after this sync
+                resp = await self.client.sync(timeout=1000, sync_filter=FIRST_SYNC_FILTER)
+                if not hasattr(resp, 'next_batch'):
+                    self.logger.error(f"[{self.name}] Matrix sync failed: {resp}")
+                    return
             self.client.add_event_callback(self._on_text, RoomMessageText)
             self.client.add_event_callback(self._on_audio, RoomMessageAudio)
-            await self.client.sync_forever(timeout=30000)
+            await self.client.sync_forever(timeout=MATRIX_SYNC_TIMEOUT, sync_filter=SYNC_FILTER)
         except asyncio.CancelledError:
             pass
         except Exception as e:
@@ -87,42 +158,34 @@ class MatrixManager:
             url = event.source['content']['url']
             
         if url:
-            try:
-                os.makedirs("downloads", exist_ok=True)
-                # Use simplified filename to avoid issues with special chars in event_id
-                safe_name = f"audio_{int(time.time())}_{event.event_id[-8:]}.wav"
-                filename = os.path.join("downloads", safe_name)
-                abs_path = os.path.abspath(filename)
-                
-                # matrix-nio download to memory to ensure we have data
-                resp = await self.client.download(mxc=url)
-                
-                if isinstance(resp, DownloadResponse):
-                    data = resp.body
-                    self.logger.info(f"Downloaded audio data: {len(data)} bytes")
-                    
-                    if data:
-                        try:
-                            with open(abs_path, "wb") as f:
-                                f.write(data)
-                            
-                            self.logger.info(f"Saved audio to {abs_path}")
-                            
-                            if os.path.exists(abs_path):
-                                for cb in self.callbacks:
-                                    try: cb("audio", abs_path, room.room_id)
-                                    except: pass
-                            else:
-                                self.logger.error(f"File write reported success but file missing at {abs_path}")
-                        except Exception as e:
-                            self.logger.error(f"Failed to write file to disk: {e}")
-                    else:
-                        self.logger.error("Downloaded audio data is empty")
-                else:
-                    self.logger.error(f"Failed to download audio (Response): {resp}")
-                    
-            except Exception as e:
-                self.logger.error(f"Failed to download audio (Exception): {e}")
+            # Received in the background so the sync loop carries on; the room's voice notes
+            # still reach the callbacks in order (see AudioIntake)
+            await self.intake.submit(room.room_id, lambda: self._receive_audio(room, event, url), self._deliver_audio)
+
+    async def _receive_audio(self, room, event, url):
+        """Download and decode one voice note; the BotJob, or None if it can't be used."""
+        # matrix-nio downloads to memory; decoded there too, nothing hits the disk
+        resp = await self.client.download(mxc=url)
+        if not isinstance(resp, DownloadResponse):
+            self.logger.error(f"Failed to download audio (Response): {resp}")
+            return None
+        data = resp.body
+        self.logger.info(f"Downloaded audio data: {len(data)} bytes")
+        if not data:
+            self.logger.error("Downloaded audio data is empty")
+            return None
+        mime = event.source.get('content', {}).get('info', {}).get('mimetype')
+        # Decoding and the archive write run in the worker pool, off the event loop.
+        # Use simplified filename to avoid issues with special chars in event_id
+        samples, rate, path = await self.loop.run_in_executor(
+            codec_pool(), decode_and_archive, data, mime,
+            f"audio_{event.event_id[-8:]}", mimetypes.guess_extension(mime or "") or ".bin")
+        return BotJob(source="matrix", file=path, audio=samples, sample_rate=rate, chat_id=room.room_id)
+
+    def _deliver_audio(self, job):
+        for cb in self.callbacks:
+            try: cb("audio", job, job.chat_id)
+            except: pass
 
     def send_text(self, room_id, text):
         if not self.connected or not self.client: return
@@ -180,6 +243,7 @@ class MatrixManager:
             self.logger.error(f"[{self.name}] Matrix send error: {e}")
 
     def stop(self):
-        if self.client:
-            asyncio.run_coroutine_threadsafe(self.client.close(), self.loop)
-        self.loop.stop()
+        if self.own_runtime:
+            self.runtime.stop()
+        elif self.client:
+            asyncio.run_coroutine_threadsafe(self._disconnect(), self.loop)
@@ -0,0 +1,208 @@
+import threading
+import time
+import collections
+from contextlib import contextmanager
+
+WINDOW = 500        # Samples kept per stage for the rolling percentiles
+RECENT_KEYS = 50    # Recordings/jobs whose individual spans are kept
+
+class StageStats:
+    def __init__(self, window=WINDOW):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p):
+        if not self.samples: return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": max(self.samples) if self.samples else None,
+            "last": self.samples[-1] if self.samples else None,
+        }
+
+class Timings:
+    """Span-style stage timings. Each span is added to a rolling per-stage
+    histogram and, if keyed, to the span list of that recording/job id. A job
+    linked to a recording records under the recording's id, so one dictation
+    is traced from capture to paste."""
+    def __init__(self, window=WINDOW):
+        self.lock = threading.Lock()
+        self.window = window
+        self.stages = {}
+        self.by_key = collections.OrderedDict()
+        self.aliases = {} # job id -> trace key, while the job runs
+
+    def link(self, key, trace):
+        if key == trace: return
+        with self.lock:
+            self.aliases[key] = trace
+
+    def unlink(self, key):
+        with self.lock:
+            self.aliases.pop(key, None)
+
+    def record(self, stage, seconds, key=None):
+        if seconds is None: return
+        with self.lock:
+            key = self.aliases.get(key, key)
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(self.window)
+            stats.add(seconds)
+            if key is not None:
+                spans = self.by_key.setdefault(key, [])
+                spans.append((stage, seconds))
+                self.by_key.move_to_end(key)
+                while len(self.by_key) > RECENT_KEYS:
+                    self.by_key.popitem(last=False)
+
+    @contextmanager
+    def span(self, stage, key=None):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0, key)
+
+    def snapshot(self):
+        with self.lock:
+            return {stage: stats.summary() for stage, stats in self.stages.items()}
+
+    def spans_for(self, key):
+        with self.lock:
+            return list(self.by_key.get(key, []))
+
+    def recent(self, n=RECENT_KEYS):
+        """{key: [(stage, seconds), ...]} for the n most recently active keys, oldest first."""
+        with self.lock:
+            keys = list(self.by_key)[-n:]
+            return {key: list(self.by_key[key]) for key in keys}
+
+    def format(self, traces=5):
+        """Plain-text table for the diagnostics panel, followed by the spans of the
+        last few recordings/jobs."""
+        def ms(v): return "-" if v is None else f"{v * 1000:.0f}"
+        lines = [f"{'stage':<18}{'n':>6}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}  (ms)"]
+        for stage, s in sorted(self.snapshot().items()):
+            lines.append(f"{stage:<18}{s['count']:>6}{ms(s['p50']):>8}{ms(s['p95']):>8}{ms(s['p99']):>8}{ms(s['max']):>8}")
+        recent = self.recent(traces)
+        if recent:
+            lines.append("")
+            lines.append("recent (ms)")
+            for key, spans in reversed(list(recent.items())):
+                lines.append(f"{key}: " + "  ".join(f"{stage} {ms(seconds)}" for stage, seconds in spans))
+        return "\n".join(lines)
+
+# Shared by all modules
+TIMINGS = Timings()
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0)
+
+def wav_seconds(path):
+    """Duration of a WAV file, or 0 if it can't be read."""
+    try:
+        import wave
+        with wave.open(path, 'rb') as wf:
+            return wf.getnframes() / float(wf.getframerate() or 1)
+    except Exception:
+        return 0.0
+
+def _labels(labels):
+    if not labels: return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+class Registry:
+    """Counters, histograms and callback gauges rendered in the Prometheus text
+    exposition format (served on the LAN server's /metrics)."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.meta = {}       # name -> (type, help)
+        self.counters = {}   # name -> {labels tuple: value}
+        self.histograms = {} # name -> {labels tuple: [bucket counts..., sum, count]}
+        self.gauges = {}     # name -> fn() returning a number or [(labels dict, value)]
+
+    def describe(self, name, kind, help_text):
+        self.meta[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if value is None: return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound: h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def gauge(self, name, fn, help_text=""):
+        self.gauges[name] = fn
+        self.describe(name, "gauge", help_text)
+
+    def render(self):
+        lines = []
+        def header(name, default_kind):
+            kind, help_text = self.meta.get(name, (default_kind, ""))
+            if help_text: lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        
+        with self.lock:
+            counters = {n: dict(s) for n, s in self.counters.items()}
+            histograms = {n: {k: list(v) for k, v in s.items()} for n, s in self.histograms.items()}
+        
+        for name, series in sorted(counters.items()):
+            header(name, "counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(dict(key))} {value}")
+        
+        for name, series in sorted(histograms.items()):
+            header(name, "histogram")
+            for key, h in sorted(series.items()):
+                labels = dict(key)
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    lines.append(f"{name}_bucket{_labels(dict(labels, le=bound))} {h[i]}")
+                lines.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {h[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {h[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {h[-1]}")
+        
+        for name, fn in sorted(self.gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            header(name, "gauge")
+            if isinstance(value, (int, float)):
+                lines.append(f"{name} {value}")
+            else:
+                for labels, v in value:
+                    lines.append(f"{name}{_labels(labels)} {v}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Registry()
+METRICS.describe("voiceinputter_jobs_total", "counter", "Transcription jobs by source and status (accepted/completed/failed/cancelled/rejected); speculative runs are counted in voiceinputter_cache_requests_total")
+METRICS.describe("voiceinputter_transcription_latency_seconds", "histogram", "Job latency from acceptance to result")
+METRICS.describe("voiceinputter_audio_seconds_total", "counter", "Seconds of audio transcribed")
+METRICS.describe("voiceinputter_cache_requests_total", "counter", "Cache lookups by cache and result (hit/miss/stale)")
@@ -7,25 +7,31 @@ import socketserver
 import requests
 import logging
 import io
+import ssl
 import wave
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from .config import SAMPLE_RATE
+from .tasks import BotJob, RUNNING, DONE, FAILED
+from .metrics import TIMINGS, METRICS
+from .backends import read_pcm16
 
 PORT = 5000
 DISCOVERY_PORT = 5001
 DISCOVERY_MSG = b"VOICE_INPUTTER_DISCOVERY"
 
 class NetworkManager:
-    def __init__(self, comfy_client, logger):
-        self.comfy = comfy_client
+    def __init__(self, backend, logger):
+        self.backend = backend # TranscriptionBackend serving /transcribe
         self.logger = logger
         self.peers = {} # ip -> last_seen
         self.server_thread = None
         self.discovery_thread = None
         self.running = False
         
-        # Determine local IP
-        self.local_ip = self.get_local_ip()
+        self.httpd = None
+        # Determined on start(); the lookup opens a UDP socket and can stall without a network
+        self.local_ip = None
+        METRICS.gauge("voiceinputter_peers", lambda: len(self.peers), "Discovered LAN peers")
 
     def get_local_ip(self):
         try:
@@ -39,6 +45,8 @@ class NetworkManager:
 
     def start(self):
         self.running = True
+        if self.local_ip is None:
+            self.local_ip = self.get_local_ip()
         self.start_server()
         self.start_discovery()
 
@@ -49,7 +57,7 @@ class NetworkManager:
 
     # --- HTTP Server ---
     def start_server(self):
-        handler = RequestHandlerFactory(self.comfy, self.logger)
+        handler = RequestHandlerFactory(self.backend, self.logger)
         self.httpd = ThreadedHTTPServer(("0.0.0.0", PORT), handler)
         self.server_thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
         self.server_thread.start()
@@ -100,10 +108,19 @@ class NetworkManager:
 
     def send_audio_file(self, target_ip, filename):
         try:
-            url = f"http://{target_ip}:{PORT}/transcribe"
             with open(filename, 'rb') as f:
-                files = {"file": ("audio.wav", f, "audio/wav")}
-                resp = requests.post(url, files=files, timeout=30)
+                return self.send_wav(target_ip, f.read())
+        except Exception as e:
+            self.logger.error(f"Network send error: {e}")
+            return None
+
+    def send_wav(self, target_ip, data):
+        """POST WAV bytes to a peer's /transcribe; its text, or None on failure (any
+        non-200 answer, e.g. 503 when the peer's own backend failed)."""
+        try:
+            url = f"http://{target_ip}:{PORT}/transcribe"
+            files = {"file": ("audio.wav", data, "audio/wav")}
+            resp = requests.post(url, files=files, timeout=30)
             
             if resp.status_code == 200:
                 return resp.text
@@ -116,6 +133,7 @@ class NetworkManager:
 
     def send_audio(self, target_ip, audio_data):
         # Convert audio_data (list of numpy arrays) to bytes
+        import numpy as np
         try:
             audio_array = np.concatenate(audio_data, axis=0)
             audio_int16 = (audio_array * 32767).astype(np.int16)
@@ -145,10 +163,91 @@ class NetworkManager:
 class ThreadedHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
     pass
 
-def RequestHandlerFactory(comfy_client, logger):
+class PooledHTTPServer(http.server.HTTPServer):
+    """HTTPServer that handles requests on a fixed number of worker threads instead
+    of a thread per request."""
+    def __init__(self, address, handler, workers):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+def serve_routes(routes, port, logger, workers, certfile=None, keyfile=None):
+    """Start an HTTP server (HTTPS with certfile/keyfile) on its own thread that answers
+    POSTs to the given paths: routes[path](body, headers) -> (status, response bytes).
+    Returns the server; shutdown() and server_close() stop it."""
+    httpd = PooledHTTPServer(("0.0.0.0", port), RouteHandlerFactory(routes, logger), workers)
+    if certfile:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile or None)
+        # Handshake on the worker thread at first read, so a slow client can't stall accept()
+        httpd.socket = context.wrap_socket(httpd.socket, server_side=True, do_handshake_on_connect=False)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    logger.info(f"{'HTTPS' if certfile else 'HTTP'} endpoint {', '.join(routes)} on port {port}")
+    return httpd
+
+def RouteHandlerFactory(routes, logger):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            route = routes.get(self.path.split("?", 1)[0])
+            if route is None:
+                self.send_error(404)
+                return
+            try:
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                status, payload = route(body, self.headers)
+            except Exception as e:
+                logger.error(f"Server error on {self.path}: {e}")
+                self.send_error(500)
+                return
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            return # Suppress default logging
+
+    return Handler
+
+def RequestHandlerFactory(backend, logger):
     class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = METRICS.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path in ('/stats', '/traces'):
+                # Rolling per-stage latency percentiles, or the spans of recent recordings/jobs (seconds)
+                data = TIMINGS.snapshot() if self.path == '/stats' else TIMINGS.recent()
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+
         def do_POST(self):
             if self.path == '/transcribe':
+                job = None
                 try:
                     # Parse Multipart
                     # Minimal parser or use cgi? cgi is deprecated.
@@ -184,37 +283,33 @@ def RequestHandlerFactory(comfy_client, logger):
                         self.send_error(400, "No file found")
                         return
 
-                    # Save to file expected by ComfyClient
-                    # We need to hack ComfyClient to accept file path or we save to 'input_audio.wav'
-                    # ComfyClient uses INPUT_FILENAME global.
-                    # We should probably lock this if multiple requests come in?
-                    # For now, just write it.
-                    from .config import INPUT_FILENAME
-                    with open(INPUT_FILENAME, 'wb') as f:
-                        f.write(audio_bytes)
-                    
-                    # Process
-                    # We need to bypass ComfyClient.save_audio and go straight to upload/process
-                    # But ComfyClient.process takes audio_data (numpy).
-                    # We should modify ComfyClient to accept 'skip_save=True'?
-                    # Or we just use ComfyClient.upload_audio() + logic.
-                    
-                    # Wait, ComfyClient.process(audio_data) does: save_audio -> upload -> websocket.
-                    # We already saved the file.
-                    # So we can pass audio_data=None to process?
-                    # ComfyClient.process needs modification to handle "File already exists".
-                    
-                    # Let's Modify ComfyClient later. For now, assume we can call process(None) if we tweak it.
-                    # Or simpler: Trigger process with dummy data? No, save_audio checks data.
-                    
-                    # I will modify ComfyClient to check if audio_data is None, then skip save.
-                    text = comfy_client.process(None, SAMPLE_RATE)
+                    # Decoded in memory; the backend decides whether it needs a file
+                    samples, rate = read_pcm16(io.BytesIO(audio_bytes))
+                    job = BotJob(source="lan", file="", chat_id=self.client_address[0])
+                    METRICS.inc("voiceinputter_jobs_total", source="lan", status="accepted")
+                    job.mark(RUNNING)
+                    job.text = backend.transcribe(audio=samples, sample_rate=rate, job_id=job.id, source=job.source)
+                    if job.text is None:
+                        # Backend failed (or its circuit is open): tell the caller so it tries another peer
+                        job.mark(FAILED)
+                        METRICS.inc("voiceinputter_jobs_total", source="lan", status="failed")
+                        self.send_error(503, "Transcription failed")
+                        return
+                    job.mark(DONE)
+                    TIMINGS.record("total_lan", job.elapsed("queued", DONE), job.id)
+                    METRICS.inc("voiceinputter_jobs_total", source="lan", status="completed")
+                    METRICS.observe("voiceinputter_transcription_latency_seconds", job.elapsed("queued", DONE), source="lan")
+                    METRICS.inc("voiceinputter_audio_seconds_total", len(samples) / float(rate), source="lan")
+                    text = job.text
                     
                     self.send_response(200)
                     self.end_headers()
-                    self.wfile.write(text.encode() if text else b"")
+                    self.wfile.write(text.encode())
                     
                 except Exception as e:
+                    if job:
+                        job.mark(FAILED)
+                        METRICS.inc("voiceinputter_jobs_total", source="lan", status="failed")
                     logger.error(f"Server error: {e}")
                     self.send_error(500)
             else:
@@ -0,0 +1,130 @@
+import threading
+import itertools
+import time
+
+# Job classes, best first
+INTERACTIVE = "interactive" # Local dictation (hotkey / voice trigger)
+BOT = "bot"                 # Matrix / Telegram voice notes
+BULK = "bulk"               # Manual "Process All" re-queues
+CLASS_RANK = {INTERACTIVE: 0, BOT: 1, BULK: 2}
+
+# Waiting this long promotes a job by one class, so background work can't starve
+AGING_SECONDS = 15.0
+
+class JobScheduler:
+    """Priority replacement for the FIFO processing queue.
+
+    Workers get() the pending job with the best effective rank (class rank minus
+    aging), skipping classes that are at their concurrency limit. Limits of
+    None mean unlimited; keeping bot+bulk below the worker count leaves a worker
+    free for live dictation.
+
+    Jobs put() with a key (a capture source, a chat or room) run one at a time per
+    key, in the order they were queued, while different keys run in parallel.
+    key_caps[job_class] bounds the jobs pending per key (put() returns False beyond
+    it) and key_rates[job_class] = (count, seconds) is a token bucket on how often a
+    key's jobs may start, so one noisy chat can't take over the workers."""
+    def __init__(self, limits=None, aging=AGING_SECONDS, key_caps=None, key_rates=None):
+        self.cond = threading.Condition()
+        self.pending = [] # [seq, job_class, enqueued_at, item, key]
+        self.running = {c: 0 for c in CLASS_RANK}
+        self.limits = {c: None for c in CLASS_RANK}
+        if limits: self.limits.update(limits)
+        self.aging = aging
+        self.seq = itertools.count()
+        self.active = {} # id(item) -> (job_class, key), for task_done()
+        self.key_caps = key_caps or {}
+        self.key_rates = key_rates or {}
+        self.busy_keys = set()
+        self.buckets = {} # key -> [tokens, refilled_at]
+
+    def put(self, item, job_class=INTERACTIVE, key=None):
+        """Queue item; False (not queued) if key already has its class's cap of jobs pending."""
+        with self.cond:
+            cap = self.key_caps.get(job_class)
+            if key is not None and cap is not None:
+                if sum(1 for e in self.pending if e[4] == key) >= cap:
+                    return False
+            self.pending.append([next(self.seq), job_class, time.time(), item, key])
+            self.cond.notify_all()
+            return True
+
+    def _eligible(self, job_class):
+        limit = self.limits.get(job_class)
+        return limit is None or self.running[job_class] < limit
+
+    def _tokens(self, key, rate, now):
+        """Refilled token count for key, rate = (count, seconds)."""
+        count, seconds = rate
+        bucket = self.buckets.setdefault(key, [float(count), now])
+        bucket[0] = min(float(count), bucket[0] + (now - bucket[1]) * count / seconds)
+        bucket[1] = now
+        return bucket[0]
+
+    def _pick(self):
+        """(best runnable entry or None, seconds until a rate-limited key gets a token or None)."""
+        now = time.time()
+        best = None
+        best_key = None
+        wake = None
+        for entry in self.pending:
+            seq, job_class, enqueued_at, item, key = entry
+            if not self._eligible(job_class): continue
+            if key is not None:
+                if key in self.busy_keys: continue
+                rate = self.key_rates.get(job_class)
+                if rate and self._tokens(key, rate, now) < 1:
+                    count, seconds = rate
+                    wait = (1 - self.buckets[key][0]) * seconds / count
+                    wake = wait if wake is None else min(wake, wait)
+                    continue
+            rank = (CLASS_RANK[job_class] - (now - enqueued_at) / self.aging, seq)
+            if best_key is None or rank < best_key:
+                best, best_key = entry, rank
+        return best, wake
+
+    def get(self, timeout=None):
+        """Block until a job is runnable; returns the item or None on timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while True:
+                entry, wake = self._pick()
+                if entry:
+                    self.pending.remove(entry)
+                    job_class, item, key = entry[1], entry[3], entry[4]
+                    self.running[job_class] += 1
+                    self.active[id(item)] = (job_class, key)
+                    if key is not None:
+                        self.busy_keys.add(key)
+                        if self.key_rates.get(job_class): self.buckets[key][0] -= 1
+                    return item
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0: return None
+                if wake is not None:
+                    remaining = wake if remaining is None else min(remaining, wake)
+                self.cond.wait(remaining)
+
+    def task_done(self, item):
+        with self.cond:
+            job_class, key = self.active.pop(id(item), (None, None))
+            if job_class:
+                self.running[job_class] -= 1
+            self.busy_keys.discard(key)
+            self.cond.notify_all()
+
+    def remove(self, predicate):
+        """Drop pending jobs matching predicate; returns the removed items."""
+        with self.cond:
+            dropped = [e[3] for e in self.pending if predicate(e[3])]
+            self.pending = [e for e in self.pending if not predicate(e[3])]
+            return dropped
+
+    def qsize(self):
+        with self.cond:
+            return len(self.pending)
+
+    def depth_by_class(self):
+        with self.cond:
+            depth = {c: 0 for c in CLASS_RANK}
+            for e in self.pending: depth[e[1]] += 1
+            return depth
@@ -0,0 +1,127 @@
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+from .config import SAMPLE_RATE
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+def new_id():
+    return uuid.uuid4().hex[:12]
+
+@dataclass(slots=True, eq=False)
+class Recording:
+    """A saved recording in the recordings list."""
+    file: str
+    id: str = field(default_factory=new_id) # Trace key of its timing spans (see metrics.Timings)
+    text: str = ""
+    prefix_mode: Optional[str] = None
+    postfix_mode: Optional[str] = None
+    source: str = "default" # Capture source name
+    capture: dict = field(default_factory=dict) # overflows / dropped_frames / block_size
+    deleted: bool = False
+    speculative_id: Optional[str] = None # Job whose text this recording adopted
+    job_ids: set = field(default_factory=set) # TranscriptionJobs in flight, for cancelling
+    created: float = field(default_factory=time.time)
+
+@dataclass(slots=True, eq=False, kw_only=True)
+class Job:
+    """Base for work items on the processing queue. Each state change is
+    timestamped so latency can be derived from the object itself."""
+    id: str = field(default_factory=new_id)
+    state: str = QUEUED
+    timestamps: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.timestamps[QUEUED] = time.time()
+
+    def mark(self, state):
+        self.state = state
+        self.timestamps[state] = time.time()
+
+    @property
+    def origin(self):
+        """Where the audio came from, for metrics: local / lan / matrix / telegram."""
+        return "local"
+
+    @property
+    def order_key(self):
+        """Scheduler key: jobs with the same key run (and deliver) in queue order, one at
+        a time; None for no ordering."""
+        return None
+
+    @property
+    def trace(self):
+        """Key the job's timing spans are recorded under."""
+        return self.id
+
+    @property
+    def cancelled(self):
+        return self.state == CANCELLED
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def elapsed(self, start=QUEUED, end=None):
+        t0 = self.timestamps.get(start)
+        t1 = self.timestamps.get(end) if end else time.time()
+        if t0 is None or t1 is None: return None
+        return t1 - t0
+
+@dataclass(slots=True, eq=False, kw_only=True)
+class TranscriptionJob(Job):
+    """Transcribe a local Recording; should_send types the result into the target window."""
+    rec: Recording
+    should_send: bool = True
+
+    @property
+    def order_key(self):
+        # Dictation from one source is typed in recording order; re-processing isn't typed
+        return f"local:{self.rec.source}" if self.should_send else None
+
+    @property
+    def trace(self):
+        return self.rec.id
+
+@dataclass(slots=True, eq=False, kw_only=True)
+class SpeculativeJob(Job):
+    """Transcription of a recording's audio taken at the onset of silence, before
+    auto-stop confirms it. Adopted by the recording if silence is confirmed."""
+    source: str
+    audio_data: Optional[list] = None
+    text: Optional[str] = None
+    rec: Optional[Recording] = None # Set once the recording is finished and saved
+    rec_id: Optional[str] = None # Id the recording will get, from the capture source
+
+    @property
+    def order_key(self):
+        return f"local:{self.source}"
+
+    @property
+    def trace(self):
+        return self.rec_id or self.id
+
+@dataclass(slots=True, eq=False, kw_only=True)
+class BotJob(Job):
+    """Remote audio to transcribe and reply to: Matrix room, Telegram chat or LAN client."""
+    source: str # "matrix" / "telegram" / "lan"
+    file: str = "" # Archived copy, if any; the audio itself travels in memory
+    audio: Optional[object] = None # int16 samples at sample_rate
+    sample_rate: int = SAMPLE_RATE
+    chat_id: str = ""
+    text: Optional[str] = None
+
+    @property
+    def origin(self):
+        return self.source
+
+    @property
+    def order_key(self):
+        # Jobs from one chat run in order, different chats in parallel
+        return f"{self.source}:{self.chat_id}"
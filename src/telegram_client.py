@@ -1,18 +1,27 @@
 import asyncio
+import hmac
+import json
 import threading
 import logging
 import os
-import time
+import secrets
 from telegram import Update
 from telegram.ext import Application, MessageHandler, filters, ContextTypes
-from pydub import AudioSegment
+from .tasks import BotJob
+from .codec import decode_and_archive, pool as codec_pool
+from .intake import AudioIntake
+from .config import (TELEGRAM_MODE, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_PORT,
+                     TELEGRAM_WEBHOOK_CERT, TELEGRAM_WEBHOOK_KEY, TELEGRAM_WEBHOOK_SECRET, TELEGRAM_WEBHOOK_WORKERS)
 
 class TelegramManager:
     def __init__(self, logger):
         self.logger = logger
         self.application = None
         self.callbacks = []
+        self.webhook = None # Server for TELEGRAM_MODE "webhook"
+        self.webhook_secret = None
         self.loop = asyncio.new_event_loop()
+        self.intake = AudioIntake(self.loop, logger)
         self.thread = threading.Thread(target=self.start_loop, daemon=True)
         self.thread.start()
         self.connected = False
@@ -22,7 +31,7 @@ class TelegramManager:
         self.loop.run_forever()
 
     def register_callback(self, callback):
-        """Callback signature: (type: str, content: str, chat_id: str)"""
+        """Callback signature: (type: str, content: str | BotJob, chat_id: str). Audio arrives as a BotJob."""
         self.callbacks.append(callback)
 
     def connect(self, token):
@@ -31,10 +40,16 @@ class TelegramManager:
     async def _connect(self, token):
         try:
             if self.application:
+                if self.application.updater and self.application.updater.running:
+                    await self.application.updater.stop()
                 await self.application.stop()
                 await self.application.shutdown()
 
-            self.application = Application.builder().token(token).build()
+            # Updates are handled one at a time, in order; audio is received in the background (see AudioIntake)
+            builder = Application.builder().token(token)
+            if TELEGRAM_MODE == "webhook":
+                builder = builder.updater(None) # Updates arrive through our own endpoint
+            self.application = builder.build()
             
             # Handlers
             self.application.add_handler(MessageHandler(filters.VOICE | filters.AUDIO, self._handle_audio))
@@ -42,15 +57,56 @@ class TelegramManager:
 
             await self.application.initialize()
             await self.application.start()
-            # Start polling in a way that doesn't block the loop forever here
-            self.loop.create_task(self.application.updater.start_polling())
+            if TELEGRAM_MODE == "webhook":
+                await self._start_webhook()
+            else:
+                # Start polling in a way that doesn't block the loop forever here
+                # (start_polling also removes a webhook left over from webhook mode)
+                self.loop.create_task(self.application.updater.start_polling())
             
-            self.logger.info(f"Telegram Bot connected")
+            self.logger.info(f"Telegram Bot connected ({TELEGRAM_MODE})")
             self.connected = True
         except Exception as e:
             self.logger.error(f"Telegram connection error: {e}")
             self.connected = False
 
+    async def _start_webhook(self):
+        from .network import serve_routes
+        self.webhook_secret = TELEGRAM_WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        if self.webhook is None:
+            self.webhook = serve_routes({TELEGRAM_WEBHOOK_PATH: self._on_webhook}, TELEGRAM_WEBHOOK_PORT,
+                                        self.logger, TELEGRAM_WEBHOOK_WORKERS,
+                                        TELEGRAM_WEBHOOK_CERT or None, TELEGRAM_WEBHOOK_KEY or None)
+        if TELEGRAM_WEBHOOK_URL:
+            certificate = None
+            if TELEGRAM_WEBHOOK_CERT:
+                with open(TELEGRAM_WEBHOOK_CERT, "rb") as f: # Lets Telegram trust a self-signed cert
+                    certificate = f.read()
+            await self.application.bot.set_webhook(
+                url=TELEGRAM_WEBHOOK_URL, certificate=certificate, secret_token=self.webhook_secret,
+                max_connections=TELEGRAM_WEBHOOK_WORKERS, allowed_updates=["message"])
+
+    def _on_webhook(self, body, headers):
+        """Runs on a webhook server worker: hands the update to the bot's loop and returns."""
+        secret = self.webhook_secret
+        token = headers.get("X-Telegram-Bot-Api-Secret-Token") or ""
+        # Constant-time comparison, so the secret can't be guessed byte by byte from timing
+        if not secret or not hmac.compare_digest(token.encode(), secret.encode()):
+            return 403, b""
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, b""
+        if not self.application: return 503, b""
+        asyncio.run_coroutine_threadsafe(self._enqueue_update(data), self.loop)
+        return 200, b""
+
+    async def _enqueue_update(self, data):
+        try:
+            await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        except Exception as e:
+            self.logger.error(f"Bad Telegram webhook update: {e}")
+
     async def _handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not update.message or not update.message.text: return
         chat_id = str(update.message.chat_id)
@@ -70,37 +126,24 @@ class TelegramManager:
         chat_id = str(update.message.chat_id)
         self.logger.info(f"Telegram received audio from {chat_id}")
 
-        try:
-            os.makedirs("downloads", exist_ok=True)
-            # Download file
+        async def receive():
+            # Download and decode in memory; a copy is written only when archiving is on.
+            # Decoding and the archive write run in the worker pool so polling isn't blocked.
             new_file = await context.bot.get_file(audio_obj.file_id)
+            data = bytes(await new_file.download_as_bytearray())
             
             ext = ".ogg" if update.message.voice else os.path.splitext(audio_obj.file_name or "audio.mp3")[1]
-            temp_path = os.path.join("downloads", f"tg_temp_{int(time.time())}{ext}")
-            
-            await new_file.download_to_drive(temp_path)
-            
-            # Convert to WAV for ComfyUI
-            wav_path = os.path.join("downloads", f"tg_audio_{int(time.time())}.wav")
-            
-            try:
-                audio = AudioSegment.from_file(temp_path)
-                audio.export(wav_path, format="wav")
-                self.logger.info(f"Converted Telegram audio to {wav_path}")
-                
-                # Cleanup temp
-                try: os.remove(temp_path)
-                except: pass
+            samples, rate, path = await self.loop.run_in_executor(
+                codec_pool(), decode_and_archive, data, audio_obj.mime_type, "tg_audio", ext)
+            return BotJob(source="telegram", file=path, audio=samples, sample_rate=rate, chat_id=chat_id)
 
-                if os.path.exists(wav_path):
-                    for cb in self.callbacks:
-                        try: cb("audio", os.path.abspath(wav_path), chat_id)
-                        except: pass
-            except Exception as e:
-                self.logger.error(f"Failed to convert Telegram audio: {e}")
+        def deliver(job):
+            for cb in self.callbacks:
+                try: cb("audio", job, chat_id)
+                except: pass
 
-        except Exception as e:
-            self.logger.error(f"Failed to process Telegram audio: {e}")
+        # Runs in the background; this chat's voice notes still reach the callbacks in order
+        await self.intake.submit(chat_id, receive, deliver)
 
     def send_text(self, chat_id, text):
         if not self.connected or not self.application: return
@@ -110,6 +153,9 @@ class TelegramManager:
         )
 
     def stop(self):
+        if self.webhook:
+            self.webhook.shutdown()
+            self.webhook.server_close()
         if self.application:
             asyncio.run_coroutine_threadsafe(self.application.stop(), self.loop)
         self.loop.stop()
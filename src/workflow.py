@@ -0,0 +1,206 @@
+import copy
+import json
+import os
+import sys
+import threading
+import time
+
+# Placeholders serialized into the template and replaced per job
+_AUDIO = "\x00audio\x00"
+_LANGUAGE = "\x00language\x00"
+_CLIENT_ID = "\x00client_id\x00"
+
+def find_node(workflow, key, value):
+    for node_id, node in workflow.items():
+        if key == "class_type" and node.get("class_type") == value: return node_id
+        if key == "title" and node.get("_meta", {}).get("title") == value: return node_id
+    return None
+
+class WorkflowTemplate:
+    """A ComfyUI API workflow compiled once: the LoadAudio, Apply Whisper and
+    Preview Text node ids are resolved up front and the /prompt body is
+    serialized with placeholders, so each job only splices in its audio path,
+    language and client id. The source workflow is never mutated."""
+    def __init__(self, workflow, name=""):
+        self.name = name
+        self.load_node_id = find_node(workflow, "class_type", "LoadAudio")
+        self.whisper_node_id = find_node(workflow, "class_type", "Apply Whisper")
+        self.preview_text_node_id = find_node(workflow, "title", "Preview Text")
+        # Node whose 'executed' message carries the text
+        self.output_node_id = self.preview_text_node_id or self.whisper_node_id or "98"
+        
+        prompt = copy.deepcopy(workflow)
+        if self.load_node_id:
+            prompt[self.load_node_id]["inputs"]["audio"] = _AUDIO
+        if self.whisper_node_id:
+            prompt[self.whisper_node_id]["inputs"]["language"] = _LANGUAGE
+        body = json.dumps({"prompt": prompt, "client_id": _CLIENT_ID})
+        
+        # Split into literal fragments and slot names: fragment, slot, fragment, slot, ...
+        slots = {json.dumps(p): p for p in (_AUDIO, _LANGUAGE, _CLIENT_ID)}
+        self.fragments = []
+        self.slots = []
+        rest = body
+        while True:
+            hits = [(rest.find(k), k) for k in slots if rest.find(k) >= 0]
+            if not hits: break
+            pos, marker = min(hits)
+            self.fragments.append(rest[:pos])
+            self.slots.append(slots[marker])
+            rest = rest[pos + len(marker):]
+        self.fragments.append(rest)
+
+    def render(self, audio_path, language, client_id):
+        """The /prompt request body (bytes) for one job."""
+        values = {_AUDIO: audio_path, _LANGUAGE: language, _CLIENT_ID: client_id}
+        parts = [self.fragments[0]]
+        for slot, fragment in zip(self.slots, self.fragments[1:]):
+            parts.append(json.dumps(values[slot]))
+            parts.append(fragment)
+        return "".join(parts).encode("utf-8")
+
+
+RULES_FILE = "rules.json"
+WATCH_INTERVAL = 2.0 # Seconds between checks of the workflow files
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+class WorkflowRegistry:
+    """Compiled templates for the default workflow plus every *.json in the workflow
+    directory, recompiled when a file changes. rules.json in that directory routes
+    jobs, first match wins, e.g.
+        [{"workflow": "stt_small.json", "max_seconds": 4},
+         {"workflow": "stt_de.json", "language": "German"},
+         {"workflow": "stt_large.json", "min_seconds": 30},
+         {"workflow": "stt_large.json", "source": ["matrix", "telegram"]}]
+    Jobs no rule matches (or whose workflow is missing) use the default workflow."""
+    def __init__(self, logger, default_file, directory):
+        self.logger = logger
+        self.default_file = default_file
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.templates = {} # name -> (stamp, WorkflowTemplate)
+        self.rules = []
+        self.rules_stamp = None
+        self.running = False
+        self.refresh()
+
+    def default_path(self):
+        # Handle PyInstaller path
+        if hasattr(sys, '_MEIPASS'):
+            return os.path.join(sys._MEIPASS, self.default_file)
+        return self.default_file
+
+    def paths(self):
+        """name -> path of every workflow file currently on disk."""
+        found = {os.path.basename(self.default_file): self.default_path()}
+        try:
+            for entry in os.listdir(self.directory):
+                if entry.endswith(".json") and entry != RULES_FILE:
+                    found[entry] = os.path.join(self.directory, entry)
+        except OSError:
+            pass # No workflow directory; only the default workflow
+        return found
+
+    def load(self, name, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                wf = json.load(f)
+            self.logger.info(f"Loaded workflow from {path}")
+            return WorkflowTemplate(wf, name)
+        except Exception as e:
+            self.logger.error(f"Failed to load workflow file {path}: {e}")
+            return None
+
+    def refresh(self):
+        """Recompile changed workflows, drop deleted ones and reload the rules."""
+        paths = self.paths()
+        with self.lock:
+            cached = dict(self.templates)
+        templates = {}
+        for name, path in paths.items():
+            stamp = _stamp(path)
+            if stamp is None: continue
+            if name in cached and cached[name][0] == stamp:
+                templates[name] = cached[name]
+                continue
+            template = self.load(name, path)
+            if template is None:
+                if name in cached: templates[name] = cached[name] # Keep the last good version
+                continue
+            templates[name] = (stamp, template)
+        
+        rules_path = os.path.join(self.directory, RULES_FILE)
+        rules_stamp = _stamp(rules_path)
+        rules = self.rules
+        if rules_stamp != self.rules_stamp:
+            rules = []
+            if rules_stamp is not None:
+                try:
+                    with open(rules_path, 'r', encoding='utf-8') as f:
+                        rules = json.load(f)
+                    self.logger.info(f"Loaded {len(rules)} workflow rules from {rules_path}")
+                except Exception as e:
+                    self.logger.error(f"Failed to load workflow rules: {e}")
+                    rules = self.rules
+        
+        with self.lock:
+            self.templates = templates
+            self.rules = rules
+            self.rules_stamp = rules_stamp
+
+    def start(self):
+        """Watch the workflow files from a daemon thread."""
+        if self.running: return
+        self.running = True
+        threading.Thread(target=self.watch_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def watch_loop(self):
+        while self.running:
+            time.sleep(WATCH_INTERVAL)
+            try: self.refresh()
+            except Exception as e: self.logger.error(f"Workflow reload error: {e}")
+
+    @staticmethod
+    def matches(rule, seconds, language, source):
+        if "language" in rule and rule["language"] != language: return False
+        if "min_seconds" in rule and (seconds is None or seconds < rule["min_seconds"]): return False
+        if "max_seconds" in rule and (seconds is None or seconds > rule["max_seconds"]): return False
+        if "source" in rule:
+            allowed = rule["source"] if isinstance(rule["source"], list) else [rule["source"]]
+            if source not in allowed: return False
+        return True
+
+    def distinct(self):
+        """The default template plus every template a rule can route to."""
+        with self.lock:
+            templates = self.templates
+            rules = self.rules
+        names = [os.path.basename(self.default_file)] + [r.get("workflow") for r in rules]
+        seen, result = set(), []
+        for name in names:
+            if name in templates and name not in seen:
+                seen.add(name)
+                result.append(templates[name][1])
+        return result
+
+    def select(self, seconds=None, language=None, source=None):
+        """Template for a job of the given length, language and origin."""
+        with self.lock:
+            templates = self.templates
+            rules = self.rules
+        for rule in rules:
+            entry = templates.get(rule.get("workflow"))
+            if entry and self.matches(rule, seconds, language, source):
+                return entry[1]
+        entry = templates.get(os.path.basename(self.default_file))
+        # An empty template still posts (and fails like a missing workflow always did)
+        return entry[1] if entry else WorkflowTemplate({}, self.default_file)
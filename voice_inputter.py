@@ -4,21 +4,19 @@ import uuid
 import queue
 import threading
 import time
-import shutil
-import wave
-import numpy as np
-import pyautogui
-import pyperclip
-from pynput import keyboard
 import string
 
-from src.config import HOTKEY, SAMPLE_RATE
+from src.config import (HOTKEY, DEFAULT_HOTKEY, SAMPLE_RATE, PROCESSING_WORKERS, PROCESSING_LIMITS,
+                        BOT_CHAT_QUEUE, BOT_CHAT_RATE)
 from src.gui import Overlay
-from src.audio import AudioManager
+from src.audio import AudioManager, PRIMARY_SOURCE, to_int16, write_wav
 from src.comfy import ComfyClient
-from src.network import NetworkManager
-from src.matrix_client import MatrixManager
-from src.telegram_client import TelegramManager
+from src.backends import BackendRouter, PeerBackend, KeepAlive
+from src.scheduler import JobScheduler, INTERACTIVE, BOT, BULK
+from src.metrics import TIMINGS, METRICS, wav_seconds
+from src.tasks import Recording, TranscriptionJob, SpeculativeJob, BotJob, RUNNING, DONE, FAILED, CANCELLED, new_id
+# Network, Matrix and Telegram (and pyautogui/pyperclip/pynput) are imported on first use;
+# see the subsystem properties on VoiceInputterApp
 
 # Logging Setup
 logging.basicConfig(
@@ -38,98 +36,184 @@ class VoiceInputterApp:
         self.current_tap_sequence = []
         self.last_tap_time = 0
         
-        self.processing_queue = queue.Queue()
+        self.processing_queue = JobScheduler(PROCESSING_LIMITS, key_caps={BOT: BOT_CHAT_QUEUE},
+                                             key_rates={BOT: BOT_CHAT_RATE})
         self.processing_tasks_count = 0
+        self.speculative_jobs = {} # source name -> SpeculativeJob
         self.client_id = str(uuid.uuid4())
         
         # Modules
         self.gui = Overlay(self.queue)
         self.audio = AudioManager(self.queue, logger)
         self.comfy = ComfyClient(logger, self.client_id)
-        self.network = NetworkManager(self.comfy, logger)
-        self.matrix_client = MatrixManager(logger, "UserClient") # User Client (Sender)
-        self.matrix_bot = MatrixManager(logger, "BotClient")    # Bot Client (Replier)
-        self.matrix_bot.register_callback(self.on_matrix_message)
+        # Chooses ComfyUI, the in-process engine or (ComfyUI failing) a LAN peer per job
+        self.backends = BackendRouter(logger, self.comfy, peer=PeerBackend(lambda: self.network, logger))
+        self.keepalive = KeepAlive(self.backends, logger)
         
-        self.telegram = TelegramManager(logger)
-        self.telegram.register_callback(self.on_telegram_message)
+        # Chat/network subsystems are built on first use (see the properties below)
+        self.subsystems = {}
+        self.subsystems_lock = threading.RLock() # Re-entrant: a subsystem may build the ones it needs
         
         self.active_window_handle = None
         self.current_keys = set()
         self.mic_devices = []
         
-        # Recordings Management: List of dicts {'file': path, 'text': string, 'prefix_mode': str/None, 'deleted': bool}
+        # Recordings Management: List of src.tasks.Recording
         self.recordings = []
         os.makedirs("recordings", exist_ok=True)
         self.load_existing_recordings()
         
-        # Start Processing Worker
-        threading.Thread(target=self.processing_worker, daemon=True).start()
+        METRICS.gauge("voiceinputter_queue_depth",
+                      lambda: [({"class": c}, n) for c, n in self.processing_queue.depth_by_class().items()],
+                      "Jobs waiting in the processing queue by scheduler class")
+        
+        # Start Processing Workers (shared transcription pool for all sources)
+        for _ in range(PROCESSING_WORKERS):
+            threading.Thread(target=self.processing_worker, daemon=True).start()
+
+    # --- Lazily constructed subsystems ---
+    def subsystem(self, name, factory):
+        """Return the named subsystem, importing and constructing it on first use."""
+        with self.subsystems_lock:
+            if name not in self.subsystems:
+                self.subsystems[name] = factory()
+            return self.subsystems[name]
+
+    @property
+    def network(self):
+        def build():
+            from src.network import NetworkManager
+            return NetworkManager(self.backends, logger)
+        return self.subsystem("network", build)
+
+    @property
+    def matrix_runtime(self):
+        def build():
+            from src.matrix_client import MatrixRuntime
+            return MatrixRuntime(logger) # Event loop + connection pool shared by both accounts
+        return self.subsystem("matrix_runtime", build)
+
+    @property
+    def matrix_client(self):
+        def build():
+            from src.matrix_client import MatrixManager
+            return MatrixManager(logger, "UserClient", self.matrix_runtime) # User Client (Sender)
+        return self.subsystem("matrix_client", build)
+
+    @property
+    def matrix_bot(self):
+        def build():
+            from src.matrix_client import MatrixManager
+            bot = MatrixManager(logger, "BotClient", self.matrix_runtime) # Bot Client (Replier)
+            bot.register_callback(self.on_matrix_message)
+            return bot
+        return self.subsystem("matrix_bot", build)
+
+    @property
+    def telegram(self):
+        def build():
+            from src.telegram_client import TelegramManager
+            telegram = TelegramManager(logger)
+            telegram.register_callback(self.on_telegram_message)
+            return telegram
+        return self.subsystem("telegram", build)
 
     def processing_worker(self):
+        handlers = {
+            TranscriptionJob: self.process_single_item,
+            SpeculativeJob: self.process_speculative,
+            BotJob: self.process_bot_job,
+        }
         while True:
             try:
                 task = self.processing_queue.get()
                 
                 try:
-                    logger.info(f"Processing worker got task.")
-                    
-                    if isinstance(task, dict) and task.get('type') == 'bot_audio':
-                        filename = task['file']
-                        source_type = task.get('source', 'matrix')
-                        room_or_chat_id = task['id']
-                        
-                        logger.info(f"Bot processing audio from {source_type}: {filename}")
-                        
-                        from src.config import INPUT_FILENAME
-                        try:
-                            shutil.copy(filename, INPUT_FILENAME)
-                            lang = self.gui.language_var.get()
-                            text = self.comfy.process(None, SAMPLE_RATE, language=lang)
-                            if text:
-                                logger.info(f"Bot Result: {text}")
-                                if source_type == 'matrix':
-                                    self.matrix_bot.send_text(room_or_chat_id, text)
-                                elif source_type == 'telegram':
-                                    self.telegram.send_text(room_or_chat_id, text)
-                        except Exception as e:
-                            logger.error(f"Bot processing error: {e}")
-                            
+                    logger.info(f"Processing worker got {type(task).__name__} {task.id}.")
+                    if task.cancelled:
+                        logger.info("Skipping cancelled job.")
                     else:
-                        # Standard Logic
-                        if len(task) >= 2:
-                            rec = task[0]
-                            should_send = task[1]
-                            
-                        if not rec.get('deleted', False):
-                            self.process_single_item(rec, should_send)
-                        else:
-                            logger.info("Skipping deleted recording.")
-                            
+                        task.mark(RUNNING)
+                        # Spans recorded under the job id (e.g. by the backends) join its trace
+                        TIMINGS.link(task.id, task.trace)
+                        TIMINGS.record("queue_wait", task.elapsed("queued", RUNNING), task.id)
+                        handlers[type(task)](task)
+                        self.keepalive.note_activity()
+                        if task.state == DONE:
+                            TIMINGS.record(f"total_{type(task).__name__}", task.elapsed("queued", DONE), task.id)
                 except Exception as e:
+                    task.mark(FAILED)
                     logger.error(f"Processing worker error: {e}")
                 finally:
+                    TIMINGS.unlink(task.id)
+                    self.record_job_metrics(task)
                     self.queue.put(("processing_complete",))
-                    self.processing_queue.task_done()
+                    self.processing_queue.task_done(task)
 
             except Exception as e:
                 logger.error(f"Processing worker fatal error: {e}")
 
+    def record_job_metrics(self, job):
+        # Speculative jobs are counted as cache hits/misses when adopted, not as jobs
+        if isinstance(job, SpeculativeJob): return
+        status = {DONE: "completed", FAILED: "failed", CANCELLED: "cancelled"}.get(job.state)
+        if status is None: return
+        METRICS.inc("voiceinputter_jobs_total", source=job.origin, status=status)
+        if job.state == DONE:
+            METRICS.observe("voiceinputter_transcription_latency_seconds", job.elapsed("queued", DONE), source=job.origin)
+            if isinstance(job, BotJob) and job.audio is not None:
+                METRICS.inc("voiceinputter_audio_seconds_total", len(job.audio) / float(job.sample_rate), source=job.origin)
+                return
+            path = job.rec.file if isinstance(job, TranscriptionJob) else getattr(job, 'file', None)
+            if path:
+                METRICS.inc("voiceinputter_audio_seconds_total", wav_seconds(path), source=job.origin)
+
+    def process_bot_job(self, job):
+        logger.info(f"Bot processing audio from {job.source} ({job.chat_id})")
+        
+        try:
+            lang = self.gui.language_var.get()
+            if job.audio is not None:
+                job.text = self.backends.transcribe(audio=job.audio, sample_rate=job.sample_rate, language=lang,
+                                                    job_id=job.id, source=job.origin)
+            else:
+                job.text = self.backends.transcribe(job.file, language=lang, job_id=job.id, source=job.origin)
+        except Exception as e:
+            logger.error(f"Bot processing error: {e}")
+            job.text = None
+        if job.text is None:
+            # Backend failed (or its circuit is open): tell the chat instead of staying silent
+            job.mark(FAILED)
+            self.reply(job, "Sorry, that voice message couldn't be transcribed. Please try again later.")
+            return
+        job.mark(DONE)
+        if job.text:
+            logger.info(f"Bot Result: {job.text}")
+            self.reply(job, job.text)
+
+    def reply(self, job, text):
+        """Send text back to the chat a BotJob came from. Jobs of one chat finish in order
+        (the scheduler runs them one at a time), so replies keep the voice notes' order."""
+        if job.source == 'matrix':
+            self.matrix_bot.send_text(job.chat_id, text)
+        elif job.source == 'telegram':
+            self.telegram.send_text(job.chat_id, text)
+
     def load_existing_recordings(self):
         try:
             files = sorted([f for f in os.listdir("recordings") if f.endswith(".wav")])
             # For existing files, assume no prefix mode initially
-            self.recordings = [{'file': os.path.join("recordings", f), 'text': "", 'prefix_mode': None, 'postfix_mode': None} for f in files]
+            self.recordings = [Recording(os.path.join("recordings", f)) for f in files]
             self.update_gui_list()
         except: pass
 
     def calculate_full_text(self, rec):
-        text = rec.get('text', "")
+        text = rec.text
         if not text: return "" # Don't show prefix if no text? Or show? Usually show only when text exists.
         
         # Calculate Prefix
         prefix = ""
-        mode = rec.get('prefix_mode')
+        mode = rec.prefix_mode
         if mode:
             # Calculate index in group
             count = 0
@@ -138,14 +222,14 @@ class VoiceInputterApp:
                 if item is rec:
                     found = True
                     break
-                if item.get('prefix_mode') == mode: count += 1
+                if item.prefix_mode == mode: count += 1
             
             if found:
                 prefix = self.generate_prefix(count, mode)
         
         # Calculate Postfix
         postfix = ""
-        postfix_mode = rec.get('postfix_mode')
+        postfix_mode = rec.postfix_mode
         if postfix_mode:
             if postfix_mode == "space": postfix = " "
             elif postfix_mode == ", comma": postfix = ", "
@@ -162,7 +246,11 @@ class VoiceInputterApp:
         display_list = []
         full_text_parts = []
         for item in self.recordings:
-            name = os.path.basename(item['file'])
+            name = os.path.basename(item.file)
+            if item.source != PRIMARY_SOURCE:
+                name = f"[{item.source}] {name}"
+            if item.capture.get('overflows'):
+                name = "⚠ " + name # Audio was dropped while recording
             full_text = self.calculate_full_text(item)
             
             if full_text:
@@ -186,17 +274,16 @@ class VoiceInputterApp:
             
         self.gui.update_text(separator.join(full_text_parts))
 
-    def save_recording(self, audio_data):
+    def save_recording(self, audio_data, source=PRIMARY_SOURCE, capture_stats=None, rec_id=None):
         if not audio_data: return None
+        rec_id = rec_id or new_id()
+        # Sources can finish in the same second, so keep the name unique
         filename = f"recordings/rec_{int(time.time())}.wav"
+        if os.path.exists(filename) or source != PRIMARY_SOURCE:
+            filename = f"recordings/rec_{int(time.time())}_{uuid.uuid4().hex[:6]}.wav"
         try:
-            audio_array = np.concatenate(audio_data, axis=0)
-            audio_int16 = (audio_array * 32767).astype(np.int16)
-            with wave.open(filename, 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)
-                wf.setframerate(SAMPLE_RATE)
-                wf.writeframes(audio_int16.tobytes())
+            with TIMINGS.span("save_wav", rec_id):
+                write_wav(filename, audio_data)
             
             # Capture Prefix Mode
             prefix_mode = None
@@ -208,7 +295,8 @@ class VoiceInputterApp:
             if self.gui.postfix_var.get():
                 postfix_mode = self.gui.postfix_mode_var.get()
 
-            entry = {'file': filename, 'text': "", 'prefix_mode': prefix_mode, 'postfix_mode': postfix_mode}
+            entry = Recording(filename, id=rec_id, prefix_mode=prefix_mode, postfix_mode=postfix_mode,
+                              source=source, capture=capture_stats or {})
             self.recordings.append(entry)
             index = len(self.recordings) - 1
             self.update_gui_list()
@@ -247,7 +335,7 @@ class VoiceInputterApp:
                 logger.error(f"Error finding target window: {e}")
         return target_handle
 
-    def send_text_to_window(self, text, use_stale_handle=True):
+    def send_text_to_window(self, text, use_stale_handle=True, trace=None):
         should_focus = self.gui.focus_target_var.get()
         logger.info(f"Sending text: {text} | Focus: {should_focus}")
         
@@ -278,11 +366,14 @@ class VoiceInputterApp:
             except Exception as e:
                 logger.error(f"Window manipulation error: {e}")
         
-        pyperclip.copy(text)
-        try:
-            pyautogui.hotkey('ctrl', 'v')
-        except Exception as e:
-            logger.error(f"Paste failed: {e}")
+        import pyautogui
+        import pyperclip
+        with TIMINGS.span("paste", trace):
+            pyperclip.copy(text)
+            try:
+                pyautogui.hotkey('ctrl', 'v')
+            except Exception as e:
+                logger.error(f"Paste failed: {e}")
         
         if self.gui.auto_enter_var.get():
             time.sleep(0.1)
@@ -309,8 +400,13 @@ class VoiceInputterApp:
             return f"{num_to_col(idx)}) "
         return ""
 
-    def process_single_item(self, rec, should_send):
-        filename = rec['file']
+    def process_single_item(self, job):
+        rec = job.rec
+        if rec.deleted:
+            job.mark(CANCELLED)
+            logger.info("Skipping deleted recording.")
+            return
+        filename = rec.file
         
         text = None
         processed = False
@@ -337,24 +433,156 @@ class VoiceInputterApp:
         
         # Local Processing
         if not self.gui.network_client_var.get():
-            from src.config import INPUT_FILENAME
+            # "Process All" may run a recording again while it's in flight: cancel by job
+            rec.job_ids.add(job.id)
             try:
-                shutil.copy(filename, INPUT_FILENAME)
                 lang = self.gui.language_var.get()
-                text = self.comfy.process(None, SAMPLE_RATE, language=lang)
+                with TIMINGS.span("transcribe", job.id):
+                    text = self.backends.transcribe(filename, language=lang, job_id=job.id, source=job.origin)
             except Exception as e:
                 logger.error(f"Local processing error: {e}")
+            finally:
+                rec.job_ids.discard(job.id)
         
+        # None: the backend (or LAN peer) failed, e.g. with its circuit open, or the
+        # recording was deleted and its prompt cancelled
+        if rec.deleted:
+            job.mark(CANCELLED)
+        else:
+            job.mark(DONE if text is not None else FAILED)
         if text:
-            if rec.get('deleted', False): return
+            self.apply_text(rec, text, job.should_send)
+
+    def apply_text(self, rec, text, should_send):
+        if rec.deleted: return
 
-            rec['text'] = text.strip()
+        rec.text = text.strip()
+        
+        # Request UI Update (will calc prefixes)
+        self.queue.put(("refresh_ui_list", None))
+        
+        if should_send and self.gui.auto_send_var.get():
+             self.queue.put(("send_text_for_rec", rec))
+
+    def process_speculative(self, job):
+        if job.cancelled:
+            logger.info("Skipping cancelled speculative job.")
+            return
+        try:
+            # The buffer goes straight to the backend; only ComfyUI needs it on disk
+            lang = self.gui.language_var.get()
+            job.text = self.backends.transcribe(audio=to_int16(job.audio_data), sample_rate=SAMPLE_RATE,
+                                                language=lang, job_id=job.id, source=job.origin)
+        except Exception as e:
+            logger.error(f"Speculative processing error: {e}")
+        finally:
+            job.audio_data = None
+            # State goes to DONE on the coordinator thread, which also adopts the result
+            self.queue.put(("speculative_done", job))
+
+    def speculation_allowed(self):
+        # Only plain local processing can be speculated; remote modes ship the final file
+        return self.gui.auto_process_var.get() and not self.gui.network_client_var.get() \
+            and not self.gui.matrix_mode_var.get()
+
+    def start_speculative(self, source_name, audio_data, rec_id=None):
+        self.cancel_speculative(source_name)
+        if not audio_data or not self.speculation_allowed(): return
+        job = SpeculativeJob(source=source_name, audio_data=audio_data, rec_id=rec_id)
+        self.speculative_jobs[source_name] = job
+        logger.info(f"[{source_name}] Speculative transcription started")
+        self.submit(job, INTERACTIVE)
+
+    def cancel_speculative(self, source_name):
+        job = self.speculative_jobs.pop(source_name, None)
+        if job:
+            job.mark(CANCELLED)
+            self.drop_queued(lambda t: t is job)
+            self.backends.cancel(job.id)
+            logger.info(f"[{source_name}] Speculative transcription cancelled")
+
+    def submit(self, job, job_class):
+        """Queue a job for the processing workers (coordinator thread only). Jobs with the
+        same order_key (capture source, bot chat) run one at a time in submit order, so
+        text is typed / replies are sent in order. False if a chat has too many waiting."""
+        key = job.order_key
+        if not self.processing_queue.put(job, job_class, key=key):
+            METRICS.inc("voiceinputter_jobs_total", source=job.origin, status="rejected")
+            logger.warning(f"Chat {key} has {BOT_CHAT_QUEUE} voice messages waiting; refusing another")
+            self.reply(job, "Too many voice messages waiting, please try again in a moment.")
+            return False
+        self.processing_tasks_count += 1
+        self.gui.set_processing_state(True)
+        if not isinstance(job, SpeculativeJob):
+            METRICS.inc("voiceinputter_jobs_total", source=job.origin, status="accepted")
+        return True
+
+    def drop_queued(self, predicate):
+        """Remove tasks matching predicate from processing_queue before a worker picks them up."""
+        removed = self.processing_queue.remove(predicate)
+        for job in removed:
+            if not isinstance(job, SpeculativeJob):
+                METRICS.inc("voiceinputter_jobs_total", source=job.origin, status="cancelled")
+        dropped = len(removed)
+        if dropped:
+            self.processing_tasks_count = max(0, self.processing_tasks_count - dropped)
+            self.gui.set_processing_state(self.processing_tasks_count > 0)
+        return dropped
+
+    def cancel_recordings(self, recs):
+        """Drop queued work for deleted recordings and stop any in-flight ComfyUI prompts."""
+        for rec in recs:
+            rec.deleted = True
+        dropped = self.drop_queued(lambda t: isinstance(t, TranscriptionJob) and t.rec.deleted)
+        for rec in recs:
+            for job_id in list(rec.job_ids):
+                self.backends.cancel(job_id)
+            if rec.speculative_id:
+                self.backends.cancel(rec.speculative_id)
+        if dropped: logger.info(f"Dropped {dropped} queued jobs for deleted recordings")
+
+    def adopt_speculative(self, job):
+        """Called once both the speculative job and its recording are finished."""
+        METRICS.inc("voiceinputter_cache_requests_total", cache="speculative", result="hit" if job.text else "miss")
+        if job.text:
+            logger.info(f"[{job.source}] Using speculative transcription")
+            self.apply_text(job.rec, job.text, True)
+        else:
+            # Speculation failed; fall back to the normal path
+            self.submit(TranscriptionJob(rec=job.rec), INTERACTIVE)
+
+    def handle_recording_finished(self, source_name):
+        source = self.audio.get_source(source_name)
+        if source is None: return
+        while True:
+            try:
+                new_audio, capture_stats = source.recordings.get_nowait()
+            except queue.Empty:
+                break
+            rec_id = capture_stats.pop('id', None)
+            # Capture thread -> coordinator hop
+            TIMINGS.record("handoff", time.time() - capture_stats.pop('stopped_at', time.time()), rec_id)
+            # Save and Add to list
+            idx = self.save_recording(new_audio, source=source_name, capture_stats=capture_stats, rec_id=rec_id)
             
-            # Request UI Update (will calc prefixes)
-            self.queue.put(("refresh_ui_list", None))
+            # Immediately Ready for next
+            if source_name == PRIMARY_SOURCE:
+                self.gui.update_ui_state("READY")
             
-            if should_send and self.gui.auto_send_var.get():
-                 self.queue.put(("send_text_for_rec", rec))
+            if idx is not None:
+                rec = self.recordings[idx]
+                should_send = self.gui.auto_process_var.get()
+                
+                job = self.speculative_jobs.pop(source_name, None)
+                if job and should_send and not job.cancelled:
+                    # Silence confirmed: the speculative job covers this recording
+                    job.rec = rec
+                    rec.speculative_id = job.id
+                    if job.state == DONE: self.adopt_speculative(job)
+                elif should_send:
+                    self.submit(TranscriptionJob(rec=rec), INTERACTIVE)
+                else:
+                    self.gui.show_process_btn()
 
     def on_matrix_message(self, msg_type, content, room_id):
         self.queue.put(("matrix_message", msg_type, content, room_id))
@@ -376,24 +604,31 @@ class VoiceInputterApp:
                     if cmd == "ui":
                         self.gui.update_ui_state(msg[1])
                     elif cmd == "audio_state":
-                        self.audio.set_state(msg[1])
-                        self.gui.update_ui_state(msg[1])
+                        # Sources own their state; only the primary one drives the UI
+                        source = msg[2] if len(msg) > 2 else PRIMARY_SOURCE
                         if msg[1] == "RECORDING":
-                            self.active_window_handle = self.get_active_window()
+                            # Load the model while the user is still speaking
+                            self.keepalive.poke()
+                        if source == PRIMARY_SOURCE:
+                            self.gui.update_ui_state(msg[1])
+                            if msg[1] == "RECORDING":
+                                self.active_window_handle = self.get_active_window()
                     elif cmd == "send_text":
                         self.send_text_to_window(msg[1])
                     
                     elif cmd == "send_text_for_rec":
                         rec = msg[1]
-                        if not rec.get('deleted', False):
+                        if not rec.deleted:
                             text = self.calculate_full_text(rec)
                             had_enter = self.gui.auto_enter_var.get()
                             
                             if not had_enter and not self.last_item_had_enter:
                                 text = " " + text
                             
-                            self.send_text_to_window(text)
+                            self.send_text_to_window(text, trace=rec.id)
                             self.last_item_had_enter = had_enter
+                            # Recording saved -> text typed
+                            TIMINGS.record("saved_to_paste", time.time() - rec.created, rec.id)
                     
                     elif cmd == "move_rec":
                         index, direction = msg[1], msg[2]
@@ -405,8 +640,8 @@ class VoiceInputterApp:
                         index = msg[1]
                         if 0 <= index < len(self.recordings):
                             item = self.recordings.pop(index)
-                            item['deleted'] = True
-                            try: os.remove(item['file'])
+                            self.cancel_recordings([item])
+                            try: os.remove(item.file)
                             except: pass
                             
                             new_sel = index - 1 if index > 0 else 0
@@ -435,32 +670,9 @@ class VoiceInputterApp:
                         self.recorded_hotkey_parts = []
                     
                     elif cmd == "set_hotkey_names":
-                        names = msg[1]
-                        self.target_hotkey_sequence = []
-                        from src.config import HOTKEY
+                        self.target_hotkey_sequence = self.keys_from_names(msg[1])
                         HOTKEY.clear()
-                        
-                        for n in names:
-                            # Map common names back to pynput Key objects
-                            k = None
-                            if n == "CTRL": k = keyboard.Key.ctrl_l
-                            elif n == "SHIFT": k = keyboard.Key.shift
-                            elif n == "ALT": k = keyboard.Key.alt_l
-                            elif n == "META": k = keyboard.Key.cmd
-                            elif n.startswith("F") and len(n) > 1:
-                                try: k = getattr(keyboard.Key, n.lower())
-                                except: pass
-                            
-                            if not k:
-                                # Try character
-                                if len(n) == 1: k = keyboard.KeyCode.from_char(n.lower())
-                                else:
-                                    try: k = getattr(keyboard.Key, n.lower())
-                                    except: pass
-                            
-                            if k: 
-                                self.target_hotkey_sequence.append(k)
-                                HOTKEY.add(k)
+                        HOTKEY.update(self.target_hotkey_sequence)
                         
                         logger.info(f"Hotkey updated to: {self.target_hotkey_sequence}")
                         
@@ -484,7 +696,7 @@ class VoiceInputterApp:
                             logger.error(f"Telegram connect dispatch error: {e}")
 
                     elif cmd == "matrix_message":
-                        msg_type, content, room_id = msg[1], msg[2], msg[3]
+                        msg_type, content = msg[1], msg[2]
                         if msg_type == "text":
                             logger.info(f"Matrix Text Received: {content}")
                             self.gui.append_text(f"[Matrix]: {content}")
@@ -495,29 +707,53 @@ class VoiceInputterApp:
                                 self.send_text_to_window(content, use_stale_handle=False)
                                 
                         elif msg_type == "audio":
-                            logger.info(f"Matrix Audio Received: {content}")
-                            self.processing_tasks_count += 1
-                            self.gui.set_processing_state(True)
-                            self.processing_queue.put({"type": "bot_audio", "source": "matrix", "file": content, "id": room_id})
+                            # content is a BotJob built by the Matrix client
+                            logger.info(f"Matrix Audio Received: {len(content.audio) / float(content.sample_rate):.1f}s")
+                            self.submit(content, BOT)
                     
                     elif cmd == "telegram_message":
-                        msg_type, content, chat_id = msg[1], msg[2], msg[3]
+                        msg_type, content = msg[1], msg[2]
                         if msg_type == "text":
                             logger.info(f"Telegram Text Received: {content}")
                             self.gui.append_text(f"[Telegram]: {content}")
                             if self.gui.auto_send_var.get():
                                 self.send_text_to_window(content, use_stale_handle=False)
                         elif msg_type == "audio":
-                            logger.info(f"Telegram Audio Received: {content}")
-                            self.processing_tasks_count += 1
-                            self.gui.set_processing_state(True)
-                            self.processing_queue.put({"type": "bot_audio", "source": "telegram", "file": content, "id": chat_id})
+                            # content is a BotJob built by the Telegram client
+                            logger.info(f"Telegram Audio Received: {len(content.audio) / float(content.sample_rate):.1f}s")
+                            self.submit(content, BOT)
                 
                     elif cmd == "processing_complete":
                         if self.processing_tasks_count > 0:
                             self.processing_tasks_count -= 1
                         self.gui.set_processing_state(self.processing_tasks_count > 0)
 
+                    elif cmd == "recording_finished":
+                        self.handle_recording_finished(msg[1])
+
+                    elif cmd == "speculative_start":
+                        self.start_speculative(*msg[1:])
+
+                    elif cmd == "speculative_cancel":
+                        self.cancel_speculative(msg[1])
+
+                    elif cmd == "speculative_done":
+                        job = msg[1]
+                        if not job.cancelled:
+                            job.mark(DONE)
+                            if job.rec is not None:
+                                self.adopt_speculative(job)
+
+                    elif cmd == "add_mic_source":
+                        try:
+                            selection_idx = msg[1]
+                            if 0 <= selection_idx < len(self.mic_devices):
+                                real_idx, name = self.mic_devices[selection_idx]
+                                self.audio.add_source(name, real_idx)
+                                self.gui.update_mic_sources(self.audio.extra_sources())
+                        except Exception as e:
+                            logger.error(f"Add mic source error: {e}")
+
                     elif cmd == "set_mic":
                         try:
                             selection_idx = msg[1]
@@ -535,55 +771,47 @@ class VoiceInputterApp:
                     elif self.audio.state == "RECORDING":
                         self.audio.trigger_stop()
                 
-                elif msg == "recording_finished":
-                    new_audio = self.audio.audio_data
-                    # Save and Add to list
-                    idx = self.save_recording(new_audio)
-                    
-                    # Immediately Ready for next
-                    self.gui.update_ui_state("READY")
-                    self.audio.set_state("READY")
-                    
-                    if idx is not None:
-                        rec = self.recordings[idx]
-                        should_send = self.gui.auto_process_var.get()
-                        
-                        if should_send:
-                            self.processing_tasks_count += 1
-                            self.gui.set_processing_state(True)
-                            self.processing_queue.put((rec, True))
-                        else:
-                            self.gui.show_process_btn()
+                elif msg == "clear_mic_sources":
+                    for name in self.audio.extra_sources():
+                        self.audio.remove_source(name)
+                    self.gui.update_mic_sources([])
 
                 elif msg == "manual_process":
                     if self.recordings:
-                        self.processing_tasks_count += len(self.recordings)
-                        self.gui.set_processing_state(True)
                         for rec in self.recordings:
-                            self.processing_queue.put((rec, False))
+                            self.submit(TranscriptionJob(rec=rec, should_send=False), BULK)
                     else:
                         logger.warning("No recordings to process")
                 
                 elif msg == "clear_all":
+                    self.cancel_recordings(self.recordings)
                     for rec in self.recordings:
-                        rec['deleted'] = True
-                        try: os.remove(rec['file'])
+                        try: os.remove(rec.file)
                         except: pass
                     self.recordings = []
                     self.update_gui_list()
 
+                elif msg == "refresh_stats":
+                    self.gui.update_stats(TIMINGS.format())
+
                 elif msg == "scan_network":
                     peers = self.network.get_peers()
                     self.gui.update_peers(peers)
 
                 elif msg == "scan_mics":
                     try:
+                        # Served from the cached device table
                         devices = self.audio.get_devices()
                         self.mic_devices = devices
                         display_names = [f"{d[1]} ({d[0]})" for d in devices]
-                        self.gui.update_mic_list(display_names)
+                        current = next((i for i, d in enumerate(devices) if d[0] == self.audio.device_index), None)
+                        self.gui.update_mic_list(display_names, current)
                     except Exception as e:
                         logger.error(f"Scan mics error: {e}")
+
+                elif msg == "rescan_mics":
+                    # Re-enumerates on the audio thread, which posts "scan_mics" afterwards
+                    self.audio.request_rescan()
                 
                 elif msg == "scan_windows":
                     try:
@@ -608,11 +836,12 @@ class VoiceInputterApp:
                         logger.info("Cannot manually focus <Active Window> placeholder.")
 
                 elif msg == "quit":
-                    self.network.stop()
                     self.audio.stop()
-                    self.matrix_client.stop()
-                    self.matrix_bot.stop()
-                    self.telegram.stop()
+                    self.keepalive.stop()
+                    # Only subsystems that were actually started, users before what they depend on
+                    for subsystem in reversed(list(self.subsystems.values())):
+                        try: subsystem.stop()
+                        except Exception as e: logger.error(f"Shutdown error: {e}")
                     os._exit(0)
 
         except Exception as e:
@@ -620,6 +849,38 @@ class VoiceInputterApp:
         
         self.gui.root.after(50, self.coordinator_loop)
 
+    def keys_from_names(self, names):
+        """Map hotkey names from the GUI ("CTRL", "F9", "A") to pynput keys."""
+        from pynput import keyboard
+        keys = []
+        for n in names:
+            # Map common names back to pynput Key objects
+            k = None
+            if n == "CTRL": k = keyboard.Key.ctrl_l
+            elif n == "SHIFT": k = keyboard.Key.shift
+            elif n == "ALT": k = keyboard.Key.alt_l
+            elif n == "META": k = keyboard.Key.cmd
+            elif n.startswith("F") and len(n) > 1:
+                try: k = getattr(keyboard.Key, n.lower())
+                except: pass
+            
+            if not k:
+                # Try character
+                if len(n) == 1: k = keyboard.KeyCode.from_char(n.lower())
+                else:
+                    try: k = getattr(keyboard.Key, n.lower())
+                    except: pass
+            
+            if k: keys.append(k)
+        return keys
+
+    def start_hotkey_listener(self):
+        from pynput import keyboard
+        if not HOTKEY:
+            HOTKEY.update(self.keys_from_names(DEFAULT_HOTKEY))
+        listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
+        listener.start()
+
     def on_press(self, key):
         if self.is_recording_hotkey:
             self.recorded_hotkey_parts.append(key)
@@ -642,7 +903,6 @@ class VoiceInputterApp:
         # Only use chord logic if we don't have a multi-part sequence defined
         # This prevents "F8+F8" from triggering on the first "F8"
         if len(self.target_hotkey_sequence) <= 1:
-            from src.config import HOTKEY
             if key in HOTKEY:
                 self.current_keys.add(key)
                 if all(k in self.current_keys for k in HOTKEY):
@@ -651,7 +911,6 @@ class VoiceInputterApp:
     def on_release(self, key):
         if self.is_recording_hotkey:
             if self.recorded_hotkey_parts:
-                from src.config import HOTKEY
                 HOTKEY.clear()
                 HOTKEY.update(self.recorded_hotkey_parts)
                 
@@ -673,15 +932,12 @@ class VoiceInputterApp:
 
     def run(self):
         logger.info("VoiceInputter started.")
-        self.network.start()
         self.sync_settings()
         
-        # Initial scans in background to speed up startup
+        # Initial scans, the hotkey listener and the LAN server start in the background
+        # so the window shows before pynput/requests/numpy-heavy modules are loaded
         threading.Thread(target=self.initial_scans, daemon=True).start()
         
-        listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
-        listener.start()
-        
         self.coordinator_loop()
         
         try:
@@ -691,8 +947,26 @@ class VoiceInputterApp:
 
     def initial_scans(self):
         self.queue.put("scan_mics")
+        # First warm-up runs on the keep-alive thread
+        self.keepalive.start()
+        try:
+            self.start_hotkey_listener()
+        except Exception as e:
+            logger.error(f"Hotkey listener error: {e}")
+        try:
+            # Peers send to us whether or not client mode is on, so the server always runs
+            self.network.start()
+        except Exception as e:
+            logger.error(f"Network server error: {e}")
+        try:
+            # Warm the paste path so the first transcription doesn't pay for the import
+            import pyautogui, pyperclip
+        except Exception as e:
+            logger.error(f"Paste backend error: {e}")
         try:
-            langs = self.comfy.get_languages()
+            # Cached list comes back at once; a changed list is posted again after revalidation
+            langs = self.comfy.get_languages(
+                on_refresh=lambda langs: self.queue.put(("update_languages", langs)))
             self.queue.put(("update_languages", langs))
         except Exception as e:
             logger.error(f"Background scan error: {e}")
@@ -702,7 +976,8 @@ class VoiceInputterApp:
             self.gui.vad_auto_stop_var.get(),
             self.gui.vad_trigger_var.get(),
             self.gui.vad_silence_var.get(),
-            self.gui.vad_threshold_var.get()
+            self.gui.vad_threshold_var.get(),
+            self.gui.vad_speculative_var.get()
         )
         self.gui.root.after(500, self.sync_settings)
 